@@ -0,0 +1,47 @@
+import threading
+try:
+    import Queue as queue # Python 2
+except ImportError:
+    import queue
+
+class AsyncWriter:
+    # Runs write jobs in a background thread, in the order in which they are submitted, so that the caller can continue
+    # computing while the data is written. A job must only use data which the caller does not modify afterwards
+    # (e.g. a copy of the arrays). The jobs must not call MPI: they run outside of the main thread.
+    # With maxPending > 0, submit blocks while maxPending jobs are waiting, which bounds the memory held by the copies.
+    def __init__(self, maxPending = 0):
+        self.jobs = queue.Queue(maxPending)
+        self.error = None
+        self.thread = threading.Thread(target=self.__run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, function, *args):
+        self.jobs.put((function, args))
+
+    def wait(self):
+        # Blocks until all submitted jobs are done. Raises the first exception raised by a job.
+        self.jobs.join()
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def close(self):
+        self.wait()
+        self.jobs.put(None)
+        self.thread.join()
+
+    def __run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            function, args = job
+            try:
+                if self.error is None:
+                    function(*args)
+            except Exception as e:
+                self.error = e
+            self.jobs.task_done()
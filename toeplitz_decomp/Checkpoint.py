@@ -0,0 +1,95 @@
+import os, json
+import numpy as np
+from mpi4py import MPI
+from AsyncWriter import AsyncWriter
+
+class Checkpoint:
+    # Checkpoints of the generator of ToeplitzFactorizor. A1 and A2 of all blocks are stored in one preallocated file,
+    # processedData/<folder>/checkpoint/checkpoint.npy, of shape (2, numOfBlocks, 2, m, m) = (slot, block, A1/A2, m, m).
+    # Successive checkpoints alternate between the two slots, so the last complete checkpoint is never overwritten by the
+    # one being written. manifest.json holds the step k and the slot of the last complete checkpoint.
+    # Each process writes its own blocks from a copy, in a background thread, while the factorization continues.
+    def __init__(self, comm, folder, numOfBlocks, m):
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.Name = "processedData/{0}/checkpoint/checkpoint.npy".format(folder)
+        self.manifestName = "processedData/{0}/checkpoint/manifest.json".format(folder)
+        self.numOfBlocks = numOfBlocks
+        self.m = m
+        self.writer = AsyncWriter()
+        self.pending = None # (k, slot) of the checkpoint being written.
+
+        # Step and slot of the last complete checkpoint (k = 0: no checkpoint).
+        manifest = None
+        if self.rank == 0 and os.path.exists(self.manifestName):
+            with open(self.manifestName) as f:
+                manifest = json.load(f)
+            if manifest["numOfBlocks"] != numOfBlocks or manifest["m"] != m:
+                manifest = None
+        manifest = comm.bcast(manifest, root=0)
+        if manifest is None:
+            self.k, self.slot = 0, 1
+        else:
+            self.k, self.slot = manifest["k"], manifest["slot"]
+
+    def load(self, rank):
+        # Returns A1, A2 of block rank from the last complete checkpoint.
+        A = np.array(np.load(self.Name, mmap_mode='r')[self.slot, rank])
+        return A[0], A[1]
+
+    def save(self, k, blocks):
+        # Collective. Commits the previous checkpoint, and starts writing A1 and A2 of the blocks of this process at step k.
+        self.commit()
+        slot = 1 - self.slot
+
+        offset = 0
+        if self.rank == 0:
+            if not os.path.exists(self.Name):
+                data = np.lib.format.open_memmap(self.Name, mode='w+', dtype=complex, shape=(2, self.numOfBlocks, 2, self.m, self.m))
+            else:
+                data = np.lib.format.open_memmap(self.Name, mode='r')
+            offset = data.offset # Size of the .npy header.
+            del data
+        offset = self.comm.bcast(offset, root=0)
+
+        snapshot = [(b.rank, np.array([b.getA1(), b.getA2()], complex)) for b in blocks]
+        self.writer.submit(self.__write, offset, slot, snapshot)
+        self.pending = (k, slot)
+
+    def commit(self):
+        # Collective. Waits until the checkpoint being written is complete on all processes, and records it in the manifest.
+        if self.pending is None:
+            return
+        done = 1
+        try:
+            self.writer.wait()
+        except Exception as e:
+            print ("Rank {0} could not write checkpoint #{1}: {2}".format(self.rank, self.pending[0], e))
+            done = 0
+        done = self.comm.allreduce(done, op=MPI.MIN)
+
+        k, slot = self.pending
+        self.pending = None
+        if not done:
+            return
+        if self.rank == 0:
+            manifest = {"k": k, "slot": slot, "numOfBlocks": self.numOfBlocks, "m": self.m}
+            with open(self.manifestName + ".tmp", "w") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(self.manifestName + ".tmp", self.manifestName) # Atomic: the manifest is never partially written.
+        self.k, self.slot = k, slot
+
+    def close(self):
+        # Collective.
+        self.commit()
+        self.writer.close()
+
+    def __write(self, offset, slot, snapshot):
+        with open(self.Name, "r+b") as f:
+            for rank, A in snapshot:
+                f.seek(offset + (slot*self.numOfBlocks + rank)*A.nbytes)
+                A.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
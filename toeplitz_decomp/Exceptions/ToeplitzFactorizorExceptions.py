@@ -23,4 +23,10 @@ class InvalidPException(Exception):
         self.message = "p = {} is not greator or equal to 1".format(p)
     def __str__(self):
         return repr(self.message)
+
+class InvalidPrecisionException(Exception):
+    def __init__(self, precision):
+        self.message = "{} is not a valid precision".format(precision)
+    def __str__(self):
+        return repr(self.message)
         
@@ -53,24 +53,27 @@ class Block:
         self.setWork1(work1)
         self.setWork2(work2)
         
-    def setName(self, name):
-        self.Name = name
+    def setUcFile(self, ucFile, ucOffset):
+        # ucFile is the MPI file of the results/<folder>_uc.npy array, and ucOffset the size of its header.
+        self.ucFile = ucFile
+        self.ucOffset = ucOffset
         
     def updateuc(self, i):
-        uc = np.load(self.Name)
+        # Writes entries m*i, ..., m*(i+1)-1 of uc. Only these m entries are written, at their offset in the file.
         m = self.A1.shape[0]
         try:
 #            temp = -np.conj(self.A1).T[0,:m/2]
 #            temp2 = -np.conj(self.A1).T[1:m/2+1,0][::-1]
-            temp = -np.conj(self.A1).T[0,:m/2]
-            temp2 = -np.conj(self.A1).T[1:m/2+1,0][::-1]
+            temp = -np.conj(self.A1).T[0,:m//2]
+            temp2 = -np.conj(self.A1).T[1:m//2+1,0][::-1]
             #print temp[0]
-            uc[m*i:m*(i+1),0] = np.append(temp,temp2)
+            uc = np.append(temp,temp2)
             #Ltemp[0,:mlen], Ltemp[1:mlen+1,0][::-1]
         except m == 1:
-            uc[m*i:m*(i+1),:] = -np.conj(self.A1).T[:,:]
+            uc = -np.conj(self.A1).T[:,0]
         
-        np.save(self.Name, uc)
+        uc = np.ascontiguousarray(uc, dtype=complex)
+        self.ucFile.Write_at(self.ucOffset + uc.itemsize*m*i, uc)
     
     def getWork(self):
         return self.work1(), self.work2()
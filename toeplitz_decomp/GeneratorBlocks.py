@@ -1,23 +1,54 @@
 import numpy as np
 
 class Blocks:
+	# The blocks held by one MPI process, indexed by rank. Iterating over Blocks gives a new iterator each time, so loops
+	# over the blocks can be nested. The blocks are visited in reverse order of addition.
 	def __init__(self):
 		self.blocks = []
-		self.currPos = -1
+		self.index = {} # rank -> Block
+		self.A = None # After pack: A1 and A2 of all blocks, in order of rank.
+		self.slot = {} # After pack: rank -> position of the block in A.
 
 	def addBlock(self, block):
 		self.blocks.append(block)
+		self.index[block.rank] = block
 	
 	def hasRank(self, rank):
-		for b in self:
-			if b.rank == rank:
-				return True
+		return rank in self.index
 	
 	def getBlock(self, rank):
-		for b in self:
-			if b.rank == rank:
-				return b
-		return None
+		return self.index.get(rank)
+	
+	def ranks(self):
+		return sorted(self.index)
+	
+	def pack(self, m, dtype, A=None):
+		# Moves A1 and A2 of all blocks to one contiguous array A of shape (2, number of blocks, m, m), in order of rank,
+		# and replaces them by views of A. A is allocated unless given (e.g. in a shared-memory window). Returns A.
+		# A1 (A2) of consecutive blocks are consecutive in A, so their rows can be stacked without copies (see rows).
+		# An allocated A is zeroed lazily by the system, so zero blocks (the padding) are not copied, and take no memory
+		# until they are first written.
+		copyZeros = A is not None
+		if A is None:
+			A = np.zeros((2, len(self.blocks), m, m), dtype)
+		for i, rank in enumerate(self.ranks()):
+			b = self.index[rank]
+			for which, X in enumerate([b.getA1(), b.getA2()]):
+				if copyZeros or np.any(X):
+					A[which, i] = X
+			b.setA1(A[0, i])
+			b.setA2(A[1, i])
+			self.slot[rank] = i
+		self.A = A
+		return A
+	
+	def rows(self, ranks, which):
+		# Returns the rows of A1 (which = 0) or A2 (which = 1) of the blocks ranks, stacked in order of rank as one
+		# (len(ranks)*m x m) view of A. The blocks must be consecutive in A.
+		slots = sorted([self.slot[rank] for rank in ranks])
+		if slots != list(range(slots[0], slots[0] + len(slots))):
+			raise ValueError("Blocks {0} are not consecutive".format(sorted(ranks)))
+		return self.A[which, slots[0]:slots[-1] + 1].reshape(-1, self.A.shape[-1])
 	
 	def numOfWork1(self):
 		counter = 0
@@ -26,12 +57,7 @@ class Blocks:
 		return counter
 		
 	def __iter__(self):
-		self.currPos=len(self.blocks)
-		return self
-		
-	def next(self):
-		if self.currPos <= 0:
-			raise StopIteration
-		else:
-			self.currPos -= 1
-			return self.blocks[self.currPos]
+		return iter(self.blocks[::-1])
+	
+	def __len__(self):
+		return len(self.blocks)
@@ -0,0 +1,77 @@
+from time import time
+from mpi4py import MPI
+
+class InstrumentedComm:
+    # Wraps an MPI communicator, and counts the messages and bytes sent and received by this process, and the time spent
+    # in the calls. Receives are counted when they are posted. Other attributes are those of the communicator.
+    # Waitany and Waitall (of MPI.Request) are timed too. With a tracer (see Tracer.py), every call is also recorded as an event.
+    # stats may be shared with the InstrumentedComm of another communicator (e.g. a sub-communicator), so that both are
+    # counted together.
+    def __init__(self, comm, tracer=None, stats=None):
+        self.comm = comm
+        self.tracer = tracer
+        self.stats = stats
+        if stats is None:
+            self.stats = {"messagesSent": 0, "bytesSent": 0, "messagesReceived": 0, "bytesReceived": 0,
+                          "collectives": 0, "bytesBroadcast": 0, "mpiTime": 0.}
+
+    def __getattr__(self, name):
+        return getattr(self.comm, name)
+
+    def __count(self, key, buf):
+        self.stats["messages" + key] += 1
+        self.stats["bytes" + key] += getattr(buf, "nbytes", 0)
+
+    def __timed(self, function, *args, **kwargs):
+        start = time()
+        result = function(*args, **kwargs)
+        end = time()
+        self.stats["mpiTime"] += end - start
+        if self.tracer is not None:
+            self.tracer.add(function.__name__, start, end, cat="MPI")
+        return result
+
+    def Waitany(self, requests):
+        return self.__timed(MPI.Request.Waitany, requests)
+
+    def Waitall(self, requests):
+        return self.__timed(MPI.Request.Waitall, requests)
+
+    def Send(self, buf, dest, tag=0):
+        self.__count("Sent", buf)
+        return self.__timed(self.comm.Send, buf, dest=dest, tag=tag)
+
+    def Isend(self, buf, dest, tag=0):
+        self.__count("Sent", buf)
+        return self.__timed(self.comm.Isend, buf, dest=dest, tag=tag)
+
+    def Recv(self, buf, source, tag, status=None):
+        self.__count("Received", buf)
+        return self.__timed(self.comm.Recv, buf, source=source, tag=tag, status=status)
+
+    def Irecv(self, buf, source, tag):
+        self.__count("Received", buf)
+        return self.__timed(self.comm.Irecv, buf, source=source, tag=tag)
+
+    def Bcast(self, buf, root=0):
+        self.stats["collectives"] += 1
+        self.stats["bytesBroadcast"] += getattr(buf, "nbytes", 0)
+        return self.__timed(self.comm.Bcast, buf, root=root)
+
+    def bcast(self, obj, root=0):
+        self.stats["collectives"] += 1
+        return self.__timed(self.comm.bcast, obj, root=root)
+
+    def gather(self, obj, root=0):
+        self.stats["collectives"] += 1
+        return self.__timed(self.comm.gather, obj, root=root)
+
+    def allreduce(self, obj, op=None):
+        self.stats["collectives"] += 1
+        if op is None:
+            return self.__timed(self.comm.allreduce, obj)
+        return self.__timed(self.comm.allreduce, obj, op=op)
+
+    def Barrier(self):
+        self.stats["collectives"] += 1
+        return self.__timed(self.comm.Barrier)
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+from AsyncWriter import AsyncWriter
+
+MAXPENDING = 64 # Maximum number of saved blocks waiting to be written.
+
+# With detailedSave, the blocks of the Cholesky factor are stored in one preallocated file results/<folder>/L_blocks.npy,
+# of shape (numOfBlocks, n, m, m). Entry [k, r] is the block L_k-(r+k) (block row r+k, block column k), i.e. A1 of
+# block r after step k (-A1 for k > 0). Only r < n is stored: the other blocks of L are zero.
+
+def open_L_blocks(folder):
+    # Returns the stored blocks as a read-only memory map, or None if the run did not use an LFactorStore.
+    Name = "{0}/L_blocks.npy".format(folder)
+    if not os.path.exists(Name):
+        return None
+    return np.load(Name, mmap_mode='r')
+
+class LFactor:
+    # Lazy access to the blocks of the Cholesky factor saved with detailedSave, one m x m block at a time, from either
+    # L_blocks.npy or the L_i-j.npy files of older runs. Nothing is held in memory but the block returned.
+    def __init__(self, folder, numOfBlocks, m):
+        self.folder = folder
+        self.numOfBlocks = numOfBlocks
+        self.m = m
+        self.L_blocks = open_L_blocks(folder)
+
+    def block(self, j, i):
+        # Returns the block at block row j and block column i. Blocks above the diagonal (i > j), and blocks which
+        # were not saved, are zero.
+        if self.L_blocks is not None:
+            r = j - i
+            if 0 <= r < self.L_blocks.shape[1]:
+                return np.array(self.L_blocks[i, r])
+        elif i <= j:
+            path = "{0}/L_{1}-{2}.npy".format(self.folder, i, j)
+            if os.path.isfile(path):
+                return np.load(path)
+        return np.zeros((self.m, self.m), complex)
+
+    def stored_blocks(self):
+        # Yields (j, i) for all blocks which may be nonzero, column by column.
+        for i in range(self.numOfBlocks):
+            if self.L_blocks is not None:
+                rows = range(i, min(i + self.L_blocks.shape[1], self.numOfBlocks))
+            else:
+                rows = range(i, self.numOfBlocks)
+            for j in rows:
+                yield j, i
+
+class LFactorStore:
+    # Writes the blocks of L into L_blocks.npy. Blocks are copied, and written by a background thread (AsyncWriter)
+    # while the factorization continues. Each process writes its own blocks at their offset in the file.
+    def __init__(self, folder, numOfBlocks, n, m, comm=None):
+        self.Name = "results/{0}/L_blocks.npy".format(folder)
+        self.comm = comm
+        self.n = n
+        self.m = m
+
+        offset = 0
+        if comm is None or comm.Get_rank() == 0:
+            if not os.path.exists(self.Name):
+                L = np.lib.format.open_memmap(self.Name, mode='w+', dtype=complex, shape=(numOfBlocks, n, m, m))
+            else:
+                L = np.lib.format.open_memmap(self.Name, mode='r') # Continued from a checkpoint.
+            offset = L.offset # Size of the .npy header.
+            del L
+        if comm is not None:
+            offset = comm.bcast(offset, root=0) # Ensure that the file is created before the rest of the nodes continue.
+        self.offset = offset
+
+        self.f = open(self.Name, "r+b") # Only used by the writer thread.
+        self.writer = AsyncWriter(MAXPENDING)
+
+    def save(self, k, r, L):
+        # Saves L_k-(r+k). L may also hold the consecutive blocks L_k-(r+k+1), ... (shape (blocks, m, m)).
+        L = np.array(L, complex).reshape(-1, self.m, self.m)
+        if r >= self.n:
+            return # Zero blocks of the padding.
+        self.writer.submit(self.__write, k, r, L[:self.n - r])
+
+    def close(self):
+        # Waits until all blocks are written. Collective if the store was created with comm.
+        self.writer.close()
+        self.f.close()
+        if self.comm is not None:
+            self.comm.Barrier()
+
+    def __write(self, k, r, L):
+        self.f.seek(self.offset + (k*self.n + r)*L[0].nbytes)
+        L.tofile(self.f)
+        self.f.flush()
@@ -0,0 +1,60 @@
+import json
+from time import time
+
+class Tracer:
+    # Records the phases of the factorization on one process, and the time spent in MPI calls (see InstrumentedComm),
+    # as events of the Chrome trace format, which can be opened with chrome://tracing or https://ui.perfetto.dev.
+    # Each process is shown as one row (pid = rank), and each event holds the current loop k.
+    def __init__(self, comm):
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.events = []
+        self.k = 0
+        comm.Barrier() # Align the time origin of all processes.
+        self.start = time()
+
+    def add(self, name, start, end, cat="phase"):
+        self.events.append({"name": name, "cat": cat, "ph": "X", "pid": self.rank, "tid": 0,
+                            "ts": (start - self.start)*1e6, "dur": (end - start)*1e6, "args": {"k": self.k}})
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def save(self, fileName):
+        # Collective. Rank 0 saves the events of all processes.
+        events = self.comm.gather(self.events, root=0)
+        if self.rank == 0:
+            traceEvents = [e for rankEvents in events for e in rankEvents]
+            for rank in range(len(events)):
+                traceEvents.append({"name": "process_name", "ph": "M", "pid": rank, "args": {"name": "rank {0}".format(rank)}})
+            with open(fileName, "w") as f:
+                json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, f)
+
+class _Phase:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.begin = time()
+
+    def __exit__(self, *args):
+        self.tracer.add(self.name, self.begin, time())
+
+class NoTracer:
+    # Used when tracing is off: phases cost one method call.
+    k = 0
+    def add(self, name, start, end, cat="phase"):
+        pass
+
+    def phase(self, name):
+        return _noPhase
+
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+_noPhase = _NoPhase()
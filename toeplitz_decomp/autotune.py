@@ -0,0 +1,134 @@
+import os
+import json
+import ctypes
+import ctypes.util
+
+# Choice of the panel width p for ToeplitzFactorizor.fact(method, AUTO). The factorizer times a few loops k of the
+# decomposition for each candidate p (see ToeplitzFactorizor.__autotune), and the best p is saved to CACHE, for the
+# size m of the blocks, the number of MPI processes and the number of BLAS threads, so later jobs with the same
+# parameters skip the probe. Delete CACHE to probe again (e.g. after changing machines).
+
+AUTO = "auto"
+CACHE = "autotune_p.json"
+PROBE_LOOPS = 2 # Number of loops k timed for each candidate p.
+
+MIN_P = 8 # Halvings of m below m/4 stop at this number of columns.
+
+def candidates(m):
+    # m, and the divisors of m closest to m/2, m/4, and to the further halvings of m down to MIN_P columns (so the
+    # panels have the same width). Without duplicates, so a small m may have a single candidate.
+    divisors = [d for d in range(1, m + 1) if m % d == 0]
+    ps = []
+    target = float(m)
+    while (len(ps) < 3 and target >= 1) or target >= MIN_P:
+        p = min(divisors, key=lambda d: (abs(d - target), -d))
+        if p not in ps:
+            ps.append(p)
+        target /= 2
+    return ps
+
+# Thread functions (set, get) of the BLAS libraries and of the OpenMP runtimes (used by ESSL SMP on the BGQ, and by
+# OpenBLAS and MKL when built with OpenMP), and the libraries which may provide them. OpenBLAS may be built with a
+# prefix and a suffix on its symbols (as in the NumPy and SciPy wheels).
+THREAD_FUNCTIONS = [("openblas_set_num_threads", "openblas_get_num_threads"), ("MKL_Set_Num_Threads", "MKL_Get_Max_Threads"),
+                    ("omp_set_num_threads", "omp_get_max_threads")]
+THREAD_LIBRARIES = ["openblas", "mkl_rt", "gomp", "iomp5", "omp", "xlsmp", "esslsmp"]
+RTLD_NOLOAD = getattr(os, "RTLD_NOLOAD", 4) # Linux value, for Python 2.
+
+class BlasLimits(object):
+    # Number of BLAS threads set through the thread functions of the libraries loaded in the process, with the
+    # interface of threadpoolctl.threadpool_limits (for Python 2.7, where threadpoolctl is not available).
+    def __init__(self, functions, threads):
+        self.original = [(setThreads, getThreads()) for setThreads, getThreads in functions]
+        for setThreads, getThreads in functions:
+            setThreads(threads)
+    
+    def restore_original_limits(self):
+        for setThreads, threads in self.original:
+            setThreads(threads)
+
+def loaded_libraries():
+    # The process itself (for statically linked libraries, as on the BGQ), and the libraries of THREAD_LIBRARIES which it
+    # has already loaded: found in /proc/self/maps (Linux), or by name. Libraries are never loaded here, since a runtime
+    # which BLAS does not use would not change its threads.
+    libraries = [ctypes.CDLL(None)]
+    paths = []
+    try:
+        with open("/proc/self/maps") as f:
+            paths = [line.split()[-1] for line in f if line.split()[-1].startswith("/")]
+    except (IOError, OSError):
+        pass
+    paths = [path for path in paths if any(name in os.path.basename(path) for name in THREAD_LIBRARIES)]
+    paths += [ctypes.util.find_library(name) for name in THREAD_LIBRARIES]
+    for path in sorted(set(path for path in paths if path)):
+        try:
+            libraries.append(ctypes.CDLL(path, mode=RTLD_NOLOAD))
+        except OSError:
+            pass # Not loaded.
+    return libraries
+
+def thread_functions():
+    # The (set, get) thread functions of THREAD_FUNCTIONS found in the loaded libraries.
+    functions = []
+    for library in loaded_libraries():
+        for setName, getName in THREAD_FUNCTIONS:
+            for prefix, suffix in [("", ""), ("", "64_"), ("scipy_", ""), ("scipy_", "64_")]:
+                setThreads = getattr(library, prefix + setName + suffix, None)
+                getThreads = getattr(library, prefix + getName + suffix, None)
+                if setThreads is not None and getThreads is not None:
+                    functions.append((setThreads, getThreads))
+    return functions
+
+def limit_blas_threads(threads):
+    # Sets the number of BLAS threads of this process, with threadpoolctl if it is installed, else with the thread
+    # functions of the loaded libraries. Returns an object whose restore_original_limits() restores the previous number,
+    # or None if no way to set it was found.
+    try:
+        from threadpoolctl import threadpool_limits
+        return threadpool_limits(threads, user_api="blas")
+    except ImportError:
+        pass
+    functions = thread_functions()
+    if not functions:
+        return None
+    return BlasLimits(functions, threads)
+
+def blas_threads():
+    # Number of threads used by BLAS, from threadpoolctl if it is installed, else from the environment, else from the
+    # thread functions of the loaded libraries (see limit_blas_threads).
+    try:
+        from threadpoolctl import threadpool_info
+        threads = [pool["num_threads"] for pool in threadpool_info() if pool["user_api"] == "blas"]
+        if threads:
+            return max(threads)
+    except ImportError:
+        pass
+    for name in ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]:
+        if os.environ.get(name):
+            return int(os.environ[name])
+    threads = [getThreads() for setThreads, getThreads in thread_functions()]
+    if threads:
+        return max(threads)
+    return None # Library default.
+
+
+def cache_key(m, size, threads):
+    return "m={0} size={1} threads={2}".format(m, size, threads)
+
+def load_p(m, size, threads, method):
+    # Returns the cached p, or None.
+    if not os.path.exists(CACHE):
+        return None
+    with open(CACHE) as f:
+        cache = json.load(f)
+    return cache.get(cache_key(m, size, threads), {}).get(method)
+
+def save_p(m, size, threads, method, p):
+    cache = {}
+    if os.path.exists(CACHE):
+        with open(CACHE) as f:
+            cache = json.load(f)
+    cache.setdefault(cache_key(m, size, threads), {})[method] = p
+    with open(CACHE + ".tmp", "w") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.rename(CACHE + ".tmp", CACHE)
@@ -0,0 +1,55 @@
+import sys
+import numpy as np
+from time import time
+from hyperbolic_householder import WY1, WY2, YTY1, YTY2, aggregate, block_update
+
+# Times the block update of every method (wy1, wy2, yty1, yty2) on random data of the size of one step of the
+# factorization, to choose the method passed to run_real_new.py. For each panel of p columns, the transformations are
+# aggregated once (aggregate), and applied to the rows of numBlocks generator blocks (block_update).
+
+METHODS = [WY1, WY2, YTY1, YTY2]
+
+def benchmark(method, m, p, numBlocks, repeats):
+    np.random.seed(0)
+    rows = numBlocks*m
+    A1 = np.random.randn(rows, m) + 1j*np.random.randn(rows, m)
+    A2 = np.random.randn(rows, m) + 1j*np.random.randn(rows, m)
+    X2 = 0.1*(np.random.randn(m, m) + 1j*np.random.randn(m, m))/np.sqrt(m)
+
+    best = np.inf
+    for repeat in range(repeats):
+        B1 = A1.copy()
+        B2 = A2.copy()
+        start = time()
+        for sb1 in range(0, m, p):
+            eb1 = min(sb1 + p, m)
+            XX2 = X2[sb1:eb1, :]
+            S = aggregate(XX2, method)
+            block_update(B1[:, sb1:eb1], B2, XX2, S, method)
+        best = min(best, time() - start)
+
+    S = aggregate(X2[:min(p, m), :], method)
+    if isinstance(S, tuple):
+        nbytes = sum(s.nbytes for s in S)
+    else:
+        nbytes = S.nbytes
+    return best, nbytes
+
+if len(sys.argv) < 3 or len(sys.argv) > 5:
+    print ("Please pass in the following arguments: m p [numBlocks] [repeats]")
+else:
+    m = int(sys.argv[1])
+    p = int(sys.argv[2])
+    numBlocks = 1
+    repeats = 3
+    if len(sys.argv) > 3:
+        numBlocks = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        repeats = int(sys.argv[4])
+
+    times = {}
+    for method in METHODS:
+        t, nbytes = benchmark(method, m, p, numBlocks, repeats)
+        times[method] = t
+        print ("{0}: {1:.4f} s, {2} bytes per aggregated panel".format(method, t, nbytes))
+    print ("Fastest method: {0}".format(min(times, key=times.get)))
@@ -0,0 +1,98 @@
+import sys
+import os
+import json
+import shutil
+import subprocess
+import numpy as np
+from time import time
+from extraction import transform_window, block_generator, window_folder
+from toeplitz_generators import generators_path
+
+# Times ToeplitzFactorizor (run_real_new.py) on synthetic data, over a grid of (n, m, p, pad, method), with NP MPI
+# processes. The synthetic input is a random positive dynamic spectrum, extracted as in extract_realData2.py, so the
+# blocks have the same structure as those of real data, and the block Toeplitz matrix is Hermitian positive definite.
+# The runs take place in the folder benchmarks/, and the results are saved to one JSON file, with, for each run, the
+# wall time of mpirun and the statistics of each process: time per loop k, total time, peak memory (RSS) and the
+# number of messages and bytes sent and received.
+# Syntax: python benchmark_suite.py NP n m p pad method [output]
+# where n, m, p, pad, method are comma-separated lists, e.g. python benchmark_suite.py 4 8,16 16 4,8 1 yty2,wy1
+# m is the original m (as for run_real_new.py), and must be even if pad = 0.
+
+MPIRUN = ["mpirun", "-np"] # Edit this line according to the MPI launcher (e.g. ["runjob", "--np"] on the BGQ).
+WORKDIR = "benchmarks"
+
+def make_input(n, meff, seed=0):
+    # Saves the generators of a synthetic n x n block Toeplitz matrix with blocks of size meff, in processedData/.
+    sizem = meff//2
+    folder = window_folder(n, sizem, 0, 0)
+    if os.path.exists(generators_path(folder)):
+        return folder
+    if not os.path.exists("processedData/" + folder):
+        os.makedirs("processedData/" + folder)
+    np.random.seed(seed)
+    window = 0.5 + np.random.rand(n, sizem)
+    a_input = transform_window(window, verbose=False)
+    generators = np.zeros((n, 2, meff), complex)
+    for j in range(n):
+        generators[j] = block_generator(a_input[j], j)
+    np.save(generators_path(folder), generators)
+    return folder
+
+def run(NP, n, m, p, pad, method):
+    meff = 2*m if pad else m
+    folder = make_input(n, meff)
+    shutil.rmtree("processedData/{0}/checkpoint".format(folder), ignore_errors=True) # Never resume from a checkpoint.
+    statsFile = "stats_{0}_{1}_{2}_{3}_{4}_{5}.json".format(NP, n, m, p, pad, method)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_real_new.py")
+    command = MPIRUN + [str(NP), sys.executable, script, method, "0", "0", str(n), str(m), str(p), str(pad), "0", "0", statsFile]
+    start = time()
+    with open(os.devnull, "w") as devnull:
+        returncode = subprocess.call(command, stdout=devnull)
+    wallTime = time() - start
+
+    result = {"NP": NP, "n": n, "m": m, "p": p, "pad": pad, "method": method, "wallTime": wallTime, "returncode": returncode,
+              "OMP_NUM_THREADS": os.environ.get("OMP_NUM_THREADS")}
+    if returncode == 0 and os.path.exists(statsFile):
+        with open(statsFile) as f:
+            stats = json.load(f)
+        os.remove(statsFile)
+        ranks = stats["ranks"]
+        result["ranks"] = ranks
+        result["totalTime"] = max(r["totalTime"] for r in ranks)
+        result["loopTimes"] = [max(t) for t in zip(*[r["loopTimes"] for r in ranks])] # Slowest process at each k.
+        result["bytesSent"] = sum(r["bytesSent"] for r in ranks)
+        if all(r["peakRSS"] is not None for r in ranks):
+            result["peakRSS"] = max(r["peakRSS"] for r in ranks)
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) != 7 and len(sys.argv) != 8:
+        print ("Please pass in the following arguments: NP n m p pad method [output]")
+        sys.exit(1)
+    NP = int(sys.argv[1])
+    ns = [int(x) for x in sys.argv[2].split(",")]
+    ms = [int(x) for x in sys.argv[3].split(",")]
+    ps = [int(x) for x in sys.argv[4].split(",")]
+    pads = [int(x) for x in sys.argv[5].split(",")]
+    methods = sys.argv[6].split(",")
+    output = os.path.abspath(sys.argv[7] if len(sys.argv) == 8 else "benchmark_{0}.json".format(int(time())))
+
+    if not os.path.exists(WORKDIR):
+        os.makedirs(WORKDIR)
+    os.chdir(WORKDIR)
+
+    results = []
+    for n in ns:
+        for m in ms:
+            for pad in pads:
+                for p in ps:
+                    for method in methods:
+                        if NP > n*(1 + pad):
+                            continue
+                        result = run(NP, n, m, p, pad, method)
+                        results.append(result)
+                        print ("n={0} m={1} p={2} pad={3} {4}: {5}".format(n, m, p, pad, method,
+                               "{0:.3f} s".format(result["totalTime"]) if "totalTime" in result else "failed"))
+                        with open(output, "w") as f:
+                            json.dump(results, f, indent=1)
+    print ("Results saved to {0}".format(output))
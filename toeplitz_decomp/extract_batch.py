@@ -0,0 +1,69 @@
+import sys
+import os
+import numpy as np
+from multiprocessing import Pool
+from extraction import extract_window, set_workers
+
+# Extracts many windows (offsetn, offsetm) of the same dynamic spectrum, as extract_realData2.py does for one window.
+# The windows are extracted in parallel by a pool of processes (one FFT thread each). Each process memory-maps the input
+# file, and only reads the windows it extracts: only the offsets are sent to the processes.
+# The windows are given either in a text file, with one line "offsetn offsetm" per window, or as "grid", which tiles
+# the whole dynamic spectrum with non-overlapping windows of size n x m.
+
+pad = 1
+use_complex64 = False # Select whether to compute the Fourier transforms in single precision (see extract_realData2.py).
+
+def init_worker(filename, shape, sizen, sizem):
+    global spectrum, window_size
+    set_workers(1) # The parallelism is over windows.
+    ## Load dynamic spectrum I(f,t). Edit this line according to file format.
+    spectrum = np.memmap(filename, dtype='float32', mode='r', shape=shape, order='F')
+    window_size = (sizen, sizem)
+
+def extract(offsets):
+    offsetn, offsetm = offsets
+    sizen, sizem = window_size
+    window = np.array(spectrum[offsetn:offsetn+sizen, offsetm:offsetm+sizem])
+    return extract_window((window, offsetn, offsetm, pad, use_complex64))
+
+def main():
+    if len(sys.argv) != 7 and len(sys.argv) != 8:
+        print ("Please pass in the following arguments: binnedDataFile numrows numcols n m windows [processes]")
+        print ("windows is a file with one line \"offsetn offsetm\" per window, or grid.")
+        sys.exit(1)
+
+    filename = str(sys.argv[1])
+    num_rows=int(sys.argv[2]) # frequency
+    num_columns=int(sys.argv[3]) # time
+    sizen=int(sys.argv[4]) # size of freq = n
+    sizem=int(sys.argv[5]) # size of time = m
+    processes = None # All cores.
+    if len(sys.argv) == 8:
+        processes = int(sys.argv[7])
+
+    if sys.argv[6] == "grid":
+        windows = [(offsetn, offsetm) for offsetn in range(0, num_rows - sizen + 1, sizen) for offsetm in range(0, num_columns - sizem + 1, sizem)]
+    else:
+        windows = [tuple(int(x) for x in line.split()) for line in open(sys.argv[6]) if line.strip()]
+
+    if len(windows) == 0:
+        print ("No windows to extract.")
+        sys.exit(1)
+    for offsetn, offsetm in windows:
+        if offsetn<0 or offsetm<0 or offsetn+sizen>num_rows or offsetm+sizem>num_columns:
+            print ("Error sizes or offsets don't match for window ({0}, {1})".format(offsetn, offsetm))
+            sys.exit(1)
+
+    if not os.path.exists("processedData/"):
+        os.makedirs("processedData/")
+
+    pool = Pool(processes, init_worker, (filename, (num_rows, num_columns), sizen, sizem))
+    for i, folder in enumerate(pool.imap_unordered(extract, windows)):
+        print ("{0}/{1}: processedData/{2}".format(i + 1, len(windows), folder))
+    pool.close()
+    pool.join()
+
+# The body runs only in the main process: the processes of the pool import this module (with the spawn start method,
+# the default on macOS and Windows), and must not start pools of their own.
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from scipy import linalg
 import numpy.linalg
 import os
 import mmap
+from toeplitz_generators import make_generator, build_block, generators_path
+from extraction import transform_window, tiled_transform_rows, block_generator, set_workers
 #from scipy.fftpack import fftshift, fft2, ifft2, ifftshift
 
 filename = str(sys.argv[1])
@@ -17,6 +19,11 @@ sizem=int(sys.argv[7]) # size of time = m
 nump=sizen
 
 build_Inm = False # Select whether to build the Block Toeplitz matrix Inm, and compute its Cholesky factor (sizes 4nm x 4nm). Requires small n, m.
+use_complex64 = False # Select whether to compute the Fourier transforms in single precision (as in toeplitz_decomp_gpu). Halves the memory used.
+fft_workers = -1 # Number of threads used by the Fourier transforms (-1: all cores).
+tiled = False # Select whether to compute the Fourier transforms out of core, in tiles of at most tile_memory bytes, with scratch files in the processedData folder. For windows which do not fit in memory.
+tile_memory = 2**28
+save_dense_blocks = False # Select whether to also save each block as a dense matrix <j>.npy (as read by toeplitz_decomp_gpu). The blocks are always saved packed, in generators.npy.
 
 
 if offsetn>num_rows or offsetm>num_columns or offsetn+sizen>num_rows or offsetm+sizem>num_columns:
@@ -28,7 +35,7 @@ a = np.memmap(sys.argv[1], dtype='float32', mode='r', shape=(num_rows,num_column
 #a = np.load(filename).real
 
 ## Choose region of frequency and time.
-print "Choosing region of frequency and time."
+print ("Choosing region of frequency and time.")
 a = a[offsetn:offsetn+sizen, offsetm:offsetm+sizem]
 
 ## Set constants.
@@ -40,43 +47,22 @@ meff=sizem+sizem*pad
 
 meff_f=meff+pad2*meff
 
-## Zero pad. 
-print "Zero padding."
-a_input=np.zeros(shape=(neff,meff), dtype=complex)
-a_input[:sizen,:sizem]=np.copy(a)
-
 ## Specify file directories.
-newdir = "gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f/2),str(offsetn),str(offsetm))
+newdir = "gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f//2),str(offsetn),str(offsetm))
 if not os.path.exists("processedData/"+newdir):	
 	os.makedirs("processedData/"+newdir)
 
 const=int(pad2*meff/2)
 
-## Ensure positive definite matrix.
-print "Square rooting."
-a_input=np.sqrt(a_input)
-
-print "Computing first Fourier transfrom"
-a_input[:sizen,:sizem]=np.fft.fft2(a_input,s=(sizen,sizem))
-
-print "Shifting blocks."
-a_input[0:sizen, meff-int(round(sizem/2.)):meff] =  a_input[0:sizen, int(sizem/2 + 0.5):sizem]
-a_input[0:sizen, int(round(sizem/2.)):sizem] = 0+0j
-
-a_input[neff-int(round(sizen/2.)):neff,0:meff] = a_input[int(sizen/2+0.5):sizen, 0:meff]
-a_input[int(round(sizen/2.)):sizen, 0:meff] = 0+0j
-
-## Inverse Fourier transform 
-print "Computing inverse Fourier transform."
-a_input=np.fft.ifft2(a_input,s=(neff,meff))
-
-print "Squaring."
-a_input=np.power(np.abs(a_input),2)
-
-print "Computing second Fourier transform."
-a_input=np.fft.fft2(a_input,s=(neff,meff))
+## Zero pad, and compute the Fourier transforms (see extraction.py).
+set_workers(fft_workers)
+if tiled:
+    transformed_rows = tiled_transform_rows(a, pad, "processedData/"+newdir, tile_memory, use_complex64)
+else:
+    a_input = transform_window(a, pad, use_complex64)
+    transformed_rows = ((j, a_input[j]) for j in range(sizen))
 
-path="processedData/gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f/2),str(offsetn),str(offsetm))
+path="processedData/gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f//2),str(offsetn),str(offsetm))
 mkdir="mkdir "+path
 
 epsilon=np.identity(int(meff_f/2))  *1e-7
@@ -86,28 +72,30 @@ if build_Inm:
     Inm = np.zeros((2*sizen*2*sizem, 2*sizen*2*sizem),complex)
 
 ## Make blocked toeplitz elements.
-print "Making blocked Toeplitz elements and saving them."
+print ("Making blocked Toeplitz elements and saving them.")
 if neff == 1:
     neff += 1
-for j in np.arange(0,int(neff/2)):
-    print '{:.2f}'.format(float(j)/(float(neff)/2)*100)+"% complete\r",
+# First column and row of each block (see toeplitz_generators.py), written as the rows are computed.
+generators = np.lib.format.open_memmap(generators_path(newdir), mode='w+', dtype=complex, shape=(int(neff/2), 2, meff))
+for j, a_row in transformed_rows:
+    sys.stdout.write('{:.2f}'.format(float(j)/(float(neff)/2)*100)+"% complete\r")
     sys.stdout.flush()
-    rows = np.append(a_input[j,:meff-const], np.zeros(pad2*meff*0+const))
-    cols = np.append(np.append(a_input[j,0], a_input[j,const+1:][::-1]), np.zeros(pad2*meff*0+const))
     file_name=path+'/'+str(j)+".npy"
-    toep_block = np.conj(sp.linalg.toeplitz(cols,rows)).T
-    np.save(file_name, toep_block)
-    if j==0:
-        toep_block = np.conj(sp.linalg.toeplitz(np.conj(np.append(a_input[j,:meff-const],np.zeros(pad2*meff*0+const))))+epsilon).T
+    generators[j] = block_generator(a_row, j, pad2)
+    if save_dense_blocks or build_Inm:
+        toep_block = build_block(generators[j])
+    if save_dense_blocks:
         np.save(file_name, toep_block)
     if build_Inm:
         normal_blocks[0:meff, j*meff:(j+1)*meff] = np.conj(toep_block.T) # undo conjugate transpose to get original blocks.
-print '{:.2f}'.format(100)+"% complete\r"
+print ('{:.2f}'.format(100)+"% complete\r")
+generators.flush()
+del generators
 # The extraction is complete at this point. The remaining code is only executed if you select to construct the block Toeplitz matrix Inm.
 
 # Build the block Toeplitz matrix Inm.
 if build_Inm:
-    print "Making block Toeplitz matrix Inm."
+    print ("Making block Toeplitz matrix Inm.")
     for j in range(2*sizen):
         Inm[j*meff:(j+1)*meff, j*meff:] = normal_blocks[:, :(2*sizen-j)*meff]
 
@@ -119,12 +107,12 @@ if build_Inm:
     # Save block Toeplitz matrix Inm.
     if not os.path.exists("results/"+newdir):	
 	    os.makedirs("results/"+newdir)
-    result_path="results/gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f/2),str(offsetn),str(offsetm))
+    result_path="results/gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f//2),str(offsetn),str(offsetm))
     np.save(result_path+'/Inm_input.npy',Inm) # Block Toeplitz matrix Inm.
 
     # Check if blocked Toeplitz matrix is Hermitian.
     hermitian = np.allclose(Inm,np.conj(Inm.T))
-    print "Inm Hermitian: "+str(hermitian)
+    print ("Inm Hermitian: "+str(hermitian))
 
     # Check if blocked Toeplitz matrix is positive definite. 
     w, v = np.linalg.eig(Inm)
@@ -133,9 +121,9 @@ if build_Inm:
         if evalue <= 0.0:
             pos_def = False
             break
-    print "Inm Positive definite: "+str(pos_def)
+    print ("Inm Positive definite: "+str(pos_def))
     
     # Compute and save the Cholesky factor of Inm.
-    print "Computing Cholesky factor of Inm."
+    print ("Computing Cholesky factor of Inm.")
     L = np.linalg.cholesky(Inm) # Lower triangular Cholesky factor. 
     np.save(result_path+'/L_input.npy',L)
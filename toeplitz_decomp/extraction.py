@@ -0,0 +1,209 @@
+import os
+import numpy as np
+from toeplitz_generators import make_generator, generators_path
+try:
+    import scipy.fft as fft # Multithreaded (workers), keeps single precision, and can work in place.
+    FFT_KWARGS = {"workers": -1, "overwrite_x": True}
+except ImportError:
+    import numpy.fft as fft # Older SciPy: single threaded, always computes in double precision.
+    FFT_KWARGS = {}
+
+# Transform stage of extract_realData2.py: computes, from a window of the dynamic spectrum I(f,t), the array whose rows
+# give the blocks of the block Toeplitz matrix. Real data is transformed with real-input FFTs, and the transforms are
+# computed in place where the FFT module allows it.
+
+def set_workers(workers):
+    # Number of threads used by the FFTs (-1: all cores). Ignored by numpy.fft.
+    if "workers" in FFT_KWARGS:
+        FFT_KWARGS["workers"] = workers
+
+def real_fft2(x, out, tile_memory=2**22):
+    # 2D FFT of the real array x into the complex array out (same shape). Only half of the spectrum is computed (as
+    # rfft2), straight into out[:, :h]: the real FFTs of the rows, then the FFTs of the columns in place. The other half
+    # follows from the Hermitian symmetry X[k, l] = conj(X[-k, -l]). All three steps work on tiles of at most
+    # tile_memory bytes, so that no temporary array of the size of the spectrum is made.
+    nr, nc = x.shape
+    h = nc//2 + 1
+    itemsize = out.dtype.itemsize
+    t = max(1, tile_memory//(h*itemsize))
+    for r0 in range(0, nr, t):
+        out[r0:r0 + t, :h] = fft.rfft(x[r0:r0 + t], axis=1, **FFT_KWARGS)
+    t = max(1, tile_memory//(nr*itemsize))
+    for c0 in range(0, h, t):
+        c1 = min(c0 + t, h)
+        out[:, c0:c1] = fft.fft(out[:, c0:c1], axis=0, **FFT_KWARGS)
+    rows = (-np.arange(nr)) % nr
+    for c0 in range(h, nc, t):
+        c1 = min(c0 + t, nc)
+        out[:, c0:c1] = np.conj(out[rows, nc - c0:nc - c1:-1])
+    return out
+
+def transform_window(window, pad=1, single=False, verbose=True):
+    # window: real (sizen x sizem) window of the dynamic spectrum. Returns the complex (neff x meff) array, with
+    # neff = sizen(1 + pad), meff = sizem(1 + pad). With single, the FFTs are computed in complex64.
+    sizen, sizem = window.shape
+    neff = sizen + sizen*pad
+    meff = sizem + sizem*pad
+    real = np.float32 if single else np.float64
+    complex_ = np.complex64 if single else np.complex128
+
+    ## Zero pad.
+    a_input = np.zeros(shape=(neff,meff), dtype=complex_)
+
+    ## Ensure positive definite matrix.
+    if verbose: print ("Square rooting.")
+    if np.min(window) < 0: # The square root is complex, so the real-input transform cannot be used.
+        a_sqrt = np.sqrt(np.asarray(window, dtype=complex_))
+        if verbose: print ("Computing first Fourier transfrom")
+        a_input[:sizen,:sizem] = fft.fft2(a_sqrt, **FFT_KWARGS)
+    else:
+        a_sqrt = np.sqrt(np.asarray(window, dtype=real))
+        if verbose: print ("Computing first Fourier transfrom")
+        real_fft2(a_sqrt, a_input[:sizen,:sizem])
+    del a_sqrt
+
+    if verbose: print ("Shifting blocks.")
+    # (sizem+1)//2 and sizem//2 are the round(sizem/2.) and int(sizem/2 + 0.5) of Python 2, for odd sizes as well.
+    a_input[0:sizen, meff-(sizem+1)//2:meff] =  a_input[0:sizen, sizem//2:sizem]
+    a_input[0:sizen, (sizem+1)//2:sizem] = 0+0j
+
+    a_input[neff-(sizen+1)//2:neff,0:meff] = a_input[sizen//2:sizen, 0:meff]
+    a_input[(sizen+1)//2:sizen, 0:meff] = 0+0j
+
+    ## Inverse Fourier transform
+    if verbose: print ("Computing inverse Fourier transform.")
+    a_input[:, :] = fft.ifft2(a_input, **FFT_KWARGS)
+
+    if verbose: print ("Squaring.")
+    power = np.empty((neff,meff), dtype=real)
+    np.abs(a_input, out=power)
+    np.square(power, out=power)
+
+    if verbose: print ("Computing second Fourier transform.")
+    real_fft2(power, a_input)
+    return a_input
+
+def block_generator(a_row, j, pad2=1):
+    # Returns the generator (see toeplitz_generators.py) of block j, from row j of the transformed window.
+    meff = len(a_row)
+    const=int(pad2*meff/2)
+    rows = np.append(a_row[:meff-const], np.zeros(pad2*meff*0+const))
+    cols = np.append(np.append(a_row[0], a_row[const+1:][::-1]), np.zeros(pad2*meff*0+const))
+    if j==0:
+        # Hermitian block: toeplitz(conj(rows)) + epsilon.
+        cols = np.conj(rows)
+        cols[0] += 1e-7
+    return make_generator(cols, rows)
+
+def window_folder(sizen, sizem, offsetn, offsetm, pad=1, pad2=1):
+    # Name of the processedData folder of a window (meff is written as twice the original m).
+    meff = sizem + sizem*pad
+    meff_f = meff + pad2*meff
+    return "gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(sizen),str(meff_f//2),str(offsetn),str(offsetm))
+
+def extract_window(args):
+    # Extracts one window (as extract_realData2.py, without the optional outputs), and saves its generators.
+    # args = (window, offsetn, offsetm, pad, single). Returns the name of the folder. Used by extract_batch.py.
+    window, offsetn, offsetm, pad, single = args
+    sizen, sizem = window.shape
+    folder = window_folder(sizen, sizem, offsetn, offsetm, pad)
+    if not os.path.exists("processedData/"+folder):
+        os.makedirs("processedData/"+folder)
+    a_input = transform_window(window, pad, single, verbose=False)
+    generators = np.zeros((sizen, 2, a_input.shape[1]), complex)
+    for j in range(sizen):
+        generators[j] = block_generator(a_input[j], j)
+    np.save(generators_path(folder), generators)
+    return folder
+
+#### Tiled (out-of-core) transform ####
+# Computes the same rows as transform_window, without holding the (neff x meff) array in memory. The 2D transforms are
+# split into 1D transforms along columns and rows, computed on tiles of at most tile_memory bytes, and the intermediate
+# arrays are kept in memory-mapped scratch files (removed at the end). The window itself is only read in column tiles,
+# which are contiguous in the Fortran-ordered input file.
+
+def shifted_indices(size, eff):
+    # Index maps of the block shift in transform_window along an axis of length size, padded to eff: index c < R stays
+    # in place, and index c >= S is moved to eff - R + (c - S).
+    R = (size + 1)//2
+    S = size//2
+    keep = np.arange(0, min(R, size))
+    move = np.arange(S, size)
+    return keep, move, eff - R + (move - S)
+
+def tiled_transform_rows(window, pad=1, scratch=".", tile_memory=2**28, single=False, verbose=True):
+    # Yields (j, row j of transform_window(window, pad, single)) for j = 0, ..., sizen - 1, in order.
+    sizen, sizem = window.shape
+    neff = sizen + sizen*pad
+    meff = sizem + sizem*pad
+    real = np.float32 if single else np.float64
+    complex_ = np.complex64 if single else np.complex128
+    itemsize = np.dtype(complex_).itemsize
+    rkeep, rmove, rdst = shifted_indices(sizen, neff)
+    ckeep, cmove, cdst = shifted_indices(sizem, meff)
+
+    def tiles(length, size):
+        t = max(1, tile_memory//(length*itemsize))
+        return [(s, min(s + t, size)) for s in range(0, size, t)]
+
+    S1Name = "{0}/scratch_S1.npy".format(scratch)
+    S2Name = "{0}/scratch_S2.npy".format(scratch)
+    # S1 is read and written by column tiles in passes 1 and 3, and by row tiles only in pass 2: it is stored in Fortran
+    # order, so that its column tiles are contiguous in the file.
+    S1 = np.lib.format.open_memmap(S1Name, mode='w+', dtype=complex_, shape=(neff, meff), fortran_order=True)
+    S2 = np.lib.format.open_memmap(S2Name, mode='w+', dtype=complex_, shape=(sizen, meff))
+
+    # Pass 1 (column tiles of the window): square root, FFT along the frequency axis, and row shift.
+    # S1[:, :sizem] holds the result; the other columns are not used yet.
+    if verbose: print ("Computing first Fourier transfrom (columns)")
+    for c0, c1 in tiles(neff, sizem):
+        w = np.asarray(window[:, c0:c1])
+        if np.min(w) < 0:
+            x = fft.fft(np.sqrt(w.astype(complex_)), axis=0, **FFT_KWARGS)
+        else:
+            x = np.empty((sizen, c1 - c0), complex_)
+            h = sizen//2 + 1
+            x[:h] = fft.rfft(np.sqrt(w.astype(real)), axis=0, **FFT_KWARGS)
+            x[h:] = np.conj(x[sizen - h:0:-1])
+        t = np.zeros((neff, c1 - c0), complex_)
+        t[rkeep] = x[rkeep]
+        t[rdst] = x[rmove]
+        S1[:, c0:c1] = t
+
+    # Pass 2 (row tiles): FFT along the time axis, column shift, and inverse FFT along the time axis. Rows which are
+    # zero after the row shift stay zero (S1 is created filled with zeros).
+    if verbose: print ("Computing first Fourier transfrom (rows) and inverse Fourier transform (rows).")
+    nonzero = np.zeros(neff, bool)
+    nonzero[rkeep] = True
+    nonzero[rdst] = True
+    for r0, r1 in tiles(meff, neff):
+        if not nonzero[r0:r1].any():
+            continue
+        x = fft.fft(np.array(S1[r0:r1, :sizem]), axis=1, **FFT_KWARGS)
+        t = np.zeros((r1 - r0, meff), complex_)
+        t[:, ckeep] = x[:, ckeep]
+        t[:, cdst] = x[:, cmove]
+        S1[r0:r1] = fft.ifft(t, axis=1, **FFT_KWARGS)
+
+    # Pass 3 (column tiles): inverse FFT along the frequency axis, squaring, and second FFT along the frequency axis.
+    # The squared array is real, so only rows 0, ..., neff/2 are computed, which include the sizen rows used.
+    if verbose: print ("Computing inverse Fourier transform (columns), squaring, and second Fourier transform (columns).")
+    for c0, c1 in tiles(neff, meff):
+        x = fft.ifft(np.array(S1[:, c0:c1]), axis=0, **FFT_KWARGS)
+        power = np.abs(x).astype(real)
+        np.square(power, out=power)
+        if sizen <= neff//2 + 1:
+            S2[:, c0:c1] = fft.rfft(power, axis=0, **FFT_KWARGS)[:sizen]
+        else:
+            S2[:, c0:c1] = fft.fft(power, axis=0, **FFT_KWARGS)[:sizen]
+    del S1
+    os.remove(S1Name)
+
+    # Pass 4 (row tiles): second FFT along the time axis. The rows are final.
+    if verbose: print ("Computing second Fourier transform (rows).")
+    for r0, r1 in tiles(meff, sizen):
+        x = fft.fft(np.array(S2[r0:r1]), axis=1, **FFT_KWARGS)
+        for j in range(r0, r1):
+            yield j, x[j - r0]
+    del S2
+    os.remove(S2Name)
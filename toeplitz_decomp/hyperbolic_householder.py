@@ -0,0 +1,146 @@
+import numpy as np
+from scipy.linalg.lapack import get_lapack_funcs
+from scipy.linalg.blas import get_blas_funcs
+
+# Kernels of the hyperbolic Householder reduction shared by ToeplitzFactorizor (new_factorize_parallel.py) and
+# SerialToeplitzFactorizor (new_factorize_serial.py). A row [a1 | a2] of the generator is reduced by
+# H = I - beta*J*y*y^H with J = diag(I, -I), y = [e_j; conj(X2)].
+#
+# The product of the transformations of a panel is H = I + J*Y*T*Y^H, where Y = [E; X2^H], E holds the panel columns of
+# the identity, and T = inv(invT) is upper triangular. Applied to the rows [B1 | B2] of the generator (B1: panel columns
+# of A1, B2: A2), it gives M = (B1 - B2*X2^H)*T, B1 += M, B2 += M*X2. The methods differ in how T is stored and applied:
+#   yty2: S = invT (p x p). M is computed with a triangular solve (ztrtrs).
+#   yty1: S = T (p x p), formed once per panel with ztrtri. M is computed with a triangular multiply (ztrmm).
+#   wy1:  S = (T, W2) with W2 = -X2^H*T (m x p). The A2 side sends B2*W2 instead of B2*X2^H, so the A1 side computes
+#         M = B1*T + B2*W2, and can form B1*T before the message arrives.
+#   wy2:  S = (T, W2) with W2 = T*X2 (p x m). The A1 side sends M0 = B1 - B2*X2^H back before multiplying by T, and
+#         the A2 side applies B2 += M0*W2.
+# The WY methods store an extra m x p array per panel, and do p^2 m more flops per panel to form W2.
+#
+# The kernels work in the precision of their arguments (complex128 or complex64): the BLAS and LAPACK routines (z* or c*)
+# are selected from the type of the arrays.
+
+SEQ, WY1, WY2, YTY1, YTY2 = "seq", "wy1", "wy2", "yty1", "yty2"
+
+NB = 16 # Panels of at most NB columns are reduced column by column in factor_panel.
+
+#### ALGORITHM 5 ####
+def house_vec(a, row):
+    # Computes the Householder vector X2 and beta which eliminate row (= A2[j,:]) against the pivot a (= A1[j,j]).
+    # Returns alpha (the new A1[j,j] is -alpha), X2 and beta. A zero row needs no reduction, and gives X2 = 0, beta = 0.
+    if np.all(np.abs(row) < 1e-50): # This number was set to 1e-13, which led to highly inaccurate solutions when called. I have not seen this case.
+        return -a, np.zeros(row.shape[0], row.dtype), 0
+
+    nrm2, = get_blas_funcs(('nrm2',), (row,))
+    sigma = nrm2(row)**2
+    alpha = (a**2 - sigma)**0.5
+    if a.real < 0:
+        z = sigma/(a - alpha) # = a + alpha, without the cancellation (which gives z = 0 in complex64 for a small row).
+    else:
+        z = a + alpha
+    beta = 2*z*z/(-sigma + z*z)
+    return alpha, row/z, beta
+
+def seq_update(B1, B2, X2, beta):
+    # Applies one Householder transformation to the rows [B1 | B2], where B1 is column j of A1 and B2 the matching rows of A2.
+    if beta == 0 or B1.shape[0] == 0:
+        return
+    v = B1 - B2.dot(np.conj(X2))
+    B1 -= beta*v
+    B2 -= beta*np.outer(v, X2)
+
+def aggregate(X2, method=YTY2):
+    # Returns S, the representation of the transformations with Householder vectors X2 (p x m) used by method.
+    p_eff, m = X2.shape
+    herk, trmm = get_blas_funcs(('herk', 'trmm'), (X2,))
+    trtri, = get_lapack_funcs(('trtri',), (X2,))
+    invT = herk(1.0, X2[:p_eff, :m].T, beta=-1.0, c=np.identity(p_eff,X2.dtype).T, trans=2, lower=1, overwrite_c=0).T
+
+    for jj in range(p_eff):
+        invT[jj,jj] = (invT[jj,jj])/2.
+
+    if method == YTY2:
+        return invT
+
+    T = trtri(invT.T, lower=1)[0].T
+    if method == YTY1:
+        return T
+    elif method == WY1:
+        return T, -np.conj(X2).T.dot(T)
+    elif method == WY2:
+        return T, trmm(1.0, T.T, X2.T, side=1, lower=1).T
+
+def send_product(B2, X2, S, method=YTY2):
+    # Computed by the holder of A2 (rank r+k) and sent to the holder of A1 (rank r).
+    p_eff, m = X2.shape
+    gemm, = get_blas_funcs(('gemm',), (B2,))
+    if method == WY1:
+        return gemm(alpha=1.0, a=S[1].T, b=B2.T).T # B2*W2
+    return gemm(alpha=1.0, a=X2.T[:m, :p_eff], b=B2.T, trans_a=2).T # B2*X2^H
+
+def prepare_reply(B1, S, method=YTY2):
+    # Part of the reply of the holder of A1 which does not depend on the message (only used by wy1).
+    if method == WY1:
+        trmm, = get_blas_funcs(('trmm',), (B1,))
+        return trmm(1.0, S[0].T, B1.T, lower=1).T # B1*T
+    return None
+
+def reply(B1, C, S, method=YTY2, P=None):
+    # Computed by the holder of A1 (rank r) from the message C of send_product: returns the reply sent back to the holder
+    # of A2, and updates B1 in place.
+    if method == WY1:
+        M = P + C
+        B1 += M
+        return M
+    M = B1 - C
+    trmm, = get_blas_funcs(('trmm',), (M,))
+    if method == YTY2:
+#        M = ztrsm(alpha=1.0, a=S.T, b=M.T, lower=1).T
+        trtrs, = get_lapack_funcs(('trtrs',), (M,))
+        M = trtrs(a=S.T, b=M.T, lower=1)[0].T
+    elif method == YTY1:
+        M = trmm(1.0, S.T, M.T, lower=1).T
+    elif method == WY2:
+        B1 += trmm(1.0, S[0].T, M.T, lower=1).T
+        return M
+    B1 += M
+    return M
+
+def apply_reply(B2, X2, S, M, method=YTY2):
+    # Computed by the holder of A2 (rank r+k) from the reply M: updates B2 in place.
+    if method == WY2:
+        X2 = S[1]
+    gemm, = get_blas_funcs(('gemm',), (B2,))
+    B2[:, :] = gemm(alpha=1.0, a=X2.T, b=M.T, beta=1.0, c=B2.T).T # Very slight improvement over numpy.dot()
+
+def block_update(B1, B2, X2, S, method=YTY2):
+    # Applies the aggregated transformations (X2, S) to the rows [B1 | B2], where B1 holds the panel columns of A1
+    # and B2 the matching rows of A2. B1 and B2 are updated in place.
+    if B1.shape[0] == 0:
+        return
+    C = send_product(B2, X2, S, method)
+    M = reply(B1, C, S, method, prepare_reply(B1, S, method))
+    apply_reply(B2, X2, S, M, method)
+
+#### ALGORITHM 8 (PANEL) ####
+def factor_panel(P1, P2, nb=NB):
+    # Reduces a panel of p columns in place. P1 (p x p) holds the panel columns of the panel rows of A1, and P2 (p x m)
+    # the panel rows of A2. On return, P2 holds the Householder vectors X2 of the panel. Returns the p values of beta.
+    # The panel is split recursively: the left half is reduced, its transformations are applied to the rows of the
+    # right half with level-3 BLAS, and then the right half is reduced.
+    p = P1.shape[0]
+    betas = np.zeros(p, P1.dtype)
+    if p <= nb:
+        for j in range(p):
+            alpha, X2, beta = house_vec(P1[j,j], P2[j, :])
+            P1[j,j] = -alpha
+            P2[j, :] = X2
+            betas[j] = beta
+            seq_update(P1[j+1:, j], P2[j+1:, :], X2, beta)
+        return betas
+
+    h = p//2
+    betas[:h] = factor_panel(P1[:h, :h], P2[:h, :], nb)
+    block_update(P1[h:, :h], P2[h:, :], P2[:h, :], aggregate(P2[:h, :]))
+    betas[h:] = factor_panel(P1[h:, h:], P2[h:, :], nb)
+    return betas
@@ -23,15 +23,15 @@ p=330                       # Can set to m/4, m/2, m, 2m. Fastest when set to m/
 pad=1						# 0 for no padding; 1 for padding.
 
 nodes=64					# Nonfunctional -- only for presentation purposes.
-NP=2048						# Number of MPI processes. Must be set to 2n for this code. NP <= (RPN * bg_size)
+NP=2048						# Number of MPI processes. Must be at most n*(1 + pad); each process holds n*(1 + pad)/NP blocks. NP <= (RPN * bg_size)
 RPN=32						# Number of MPI processes per node = 1,2,4,8,16,32,64. RPN <= NP
 OMP=2           # Number of OpenMP threads per MPI process = 1,2,4,8,16,32,64. (RPN * OMP_NUM_THREADS ) <= 64 = threads per node
 
 sourcedir=/scratch/a/aparamek/sufkes/scintillometry/toeplitz_decomp # Directory of code.
 
-if [ "$NP" -ne "$(( 2*n ))" ]
+if [ "$NP" -gt "$(( n*(1 + pad) ))" ]
    then
-   echo "Error: Set the number of MPI processes to 2n. Quitting."
+   echo "Error: Set the number of MPI processes to at most n*(1 + pad). Quitting."
    exit 1   
 fi
 
@@ -1,8 +1,8 @@
 import numpy as np
 from scipy.linalg.lapack import ztrtrs
-from scipy.linalg.blas import zgeru, zherk, zgemm, dznrm2
+from scipy.linalg.blas import get_blas_funcs
 from numpy.linalg import cholesky
-import os,sys,inspect
+import os,sys,inspect,json
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 sys.path.insert(0, currentdir + "/Exceptions")
 
@@ -12,8 +12,15 @@ from mpi4py import MPI
 
 from GeneratorBlocks import Blocks
 from GeneratorBlock import Block
+from Checkpoint import Checkpoint
+from LFactorStore import LFactorStore
+from InstrumentedComm import InstrumentedComm
+from Tracer import Tracer, NoTracer
+from autotune import AUTO, CACHE, PROBE_LOOPS, candidates, blas_threads, limit_blas_threads, load_p, save_p
+from toeplitz_generators import load_generator, build_block
+from hyperbolic_householder import house_vec, factor_panel, aggregate, block_update, send_product, prepare_reply, reply, apply_reply
 
-from time import time
+from time import time, sleep
 
 MAXTIME = int(60*60*23.5) #23.5 hours in seconds
 timePerLoop = []
@@ -22,10 +29,32 @@ startTime = time()
 np.seterr(all='raise') # Stop program if NumPy error occurs.
 
 SEQ, WY1, WY2, YTY1, YTY2 = "seq", "wy1", "wy2", "yty1", "yty2"
+CHUNK = 128 # Default number of rows per message in the pipelined block updates.
+RETIRED_POLL = 0.01 # Seconds between two checks of the processes which have left the loop for its end (see __rejoin).
+
+# Precision of the generator blocks A1, A2 and of all the computations on them (block updates and their messages, reduction
+# of the pivot rows, aggregation of the panels). The Cholesky factor is saved in complex128 in both cases, but in single
+# precision it is only as accurate as complex64 (relative error of uc ~1e-7 instead of ~1e-16).
+DOUBLE, SINGLE = "double", "single"
+PRECISIONS = {DOUBLE: np.complex128, SINGLE: np.complex64}
 class ToeplitzFactorizor:
     
-    def __init__(self, folder, n,m, pad, detailedSave = False):
+    def __init__(self, folder, n,m, pad, detailedSave = False, chunk = CHUNK, checkpointInterval = 0, statsFile = None, traceFile = None, precision = DOUBLE, sharedMemory = False):
+        if precision not in PRECISIONS:
+            raise InvalidPrecisionException(precision)
+        self.dtype = np.dtype(PRECISIONS[precision])
+        if self.dtype != np.complex128:
+            np.seterr(under='ignore') # Gradual underflow of complex64 entries is harmless.
         self.comm = MPI.COMM_WORLD
+        self.statsFile = statsFile # If set, the time per loop, peak memory and MPI traffic of each process are saved to this JSON file.
+        self.traceFile = traceFile # If set, the phases and MPI calls of each process are saved to this trace file (see Tracer.py).
+        self.tracer = NoTracer()
+        self.Request = MPI.Request # Waitany and Waitall, timed along with the other MPI calls by InstrumentedComm.
+        if traceFile:
+            self.tracer = Tracer(self.comm)
+        if statsFile or traceFile:
+            self.comm = InstrumentedComm(self.comm, self.tracer if traceFile else None)
+            self.Request = self.comm
         size  = self.comm.Get_size()
         self.size = size
         self.rank = self.comm.Get_rank()
@@ -37,24 +66,37 @@ class ToeplitzFactorizor:
         
         self.detailedSave = detailedSave
         self.numOfBlocks = n*(1 + pad)
-        
-        kCheckpoint = 0 # 0 = no checkpoint
-        
-        # Check whether the code has been stopped mid-execution, and can be continued from a checkpoint.
-        if os.path.exists("processedData/" + folder + "/checkpoint"):
-            for k in range(n*(1 + self.pad) - 1, 0, -1):
-                if os.path.exists("processedData/{0}/checkpoint/{1}/".format(folder, k)):
-                    path, dirs, files = os.walk("processedData/{0}/checkpoint/{1}/".format(folder, k)).next()
-                    file_count = len(files)
-                    if file_count == 2*self.numOfBlocks:
-                        kCheckpoint = k 
-                        if self.rank == 0: 
-                            print ("Using Checkpoint #{0}".format(k))
-                        break
-        else:
+        self.chunk = chunk # Number of rows per message in the block updates.
+        self.checkpointInterval = checkpointInterval # Save a checkpoint every checkpointInterval loops (0 = only before MAXTIME).
+        self.packed = False # Whether the blocks T are stored as generators (see addBlock).
+        self.sharedMemory = sharedMemory # Whether the pairs of blocks on the same node are updated in shared memory (see __share_blocks).
+        self.win = None
+        self.nodeBlocks = {} # Block rank -> (segment, slot) of the blocks of this node, in the shared-memory window.
+        self.nodeComm = self.comm.Split_type(MPI.COMM_TYPE_SHARED) # The processes of this node.
+        # The processes (of all nodes, and of this node) which still hold blocks of the generator. The other processes
+        # have left the loop, and given their BLAS threads to those of their node (see __retire).
+        self.loopComm = self.comm
+        self.loopRanks = list(range(size))
+        self.nodeLoopComm = self.nodeComm
+        self.threads = blas_threads()
+        self.limits = None
+        
+        if not os.path.exists("processedData/" + folder + "/checkpoint"):
             if self.rank == 0:
                 os.makedirs("processedData/{0}/checkpoint/".format(folder)) # Create checkpoint folder if one does not exist.
+        
+        # Check whether the code has been stopped mid-execution, and can be continued from a checkpoint.
+        # The checkpoint is read from its manifest (the Checkpoint constructor synchronizes the processes).
+        self.checkpoint = Checkpoint(self.comm, folder, self.numOfBlocks, m)
+        kCheckpoint = self.checkpoint.k # 0 = no checkpoint
+        if kCheckpoint != 0 and self.rank == 0: 
+            print ("Using Checkpoint #{0}".format(kCheckpoint))
         self.kCheckpoint = kCheckpoint
+        # With padding, A1 of the blocks of rank >= n is never updated, and A2 of block j >= n stays zero until the first
+        # panel of loop k = j-n+1, where j first enters the generator (e2 = k+n-1). A2 of the blocks of rank >= zeroFrom
+        # is still zero: their products B2 are neither computed nor sent (see __pipelined_update and __seq_update).
+        # Every process updates zeroFrom in the same way.
+        self.zeroFrom = n + kCheckpoint
         if not os.path.exists("results"):
             if self.rank == 0:
                 os.makedirs("results") # Create results subfolder for current run if one does not exist.
@@ -62,16 +104,22 @@ class ToeplitzFactorizor:
             if self.rank == 0:
                 os.makedirs("results/{0}".format(folder))   
 
-        # Initialize and save array which stores the final Cholesky factor.
+        # Initialize the file which stores the final Cholesky factor. It is created once, with its full size, and each
+        # process then writes only its own entries of uc at their offset in the file (see Block.updateuc).
+        self.Name = "results/{0}_uc.npy".format(folder)
+        ucOffset = np.array([0])
         if self.rank==0:
-            if not os.path.exists("results/{0}".format(folder + "_uc.npy")):
-                uc = np.zeros((m*n,1), dtype=complex)
-                np.save("results/{0}".format(folder + "_uc.npy"), uc)
+            if not os.path.exists(self.Name):
+                uc = np.lib.format.open_memmap(self.Name, mode='w+', dtype=complex, shape=(m*n,1))
+            else:
+                uc = np.lib.format.open_memmap(self.Name, mode='r')
+            ucOffset[0] = uc.offset # Size of the .npy header.
+            del uc
                 
         # Ensure that files and directories are created before the rest of the nodes continue.
-        initDone = np.array([0])
-        
-        self.comm.Bcast(initDone, root=0)
+        self.comm.Bcast(ucOffset, root=0)
+        self.ucFile = MPI.File.Open(MPI.COMM_WORLD, self.Name, MPI.MODE_WRONLY)
+        self.ucOffset = int(ucOffset[0])
         
         
     def addBlock(self, rank):
@@ -79,19 +127,26 @@ class ToeplitzFactorizor:
         b = Block(rank)
         k = self.kCheckpoint
         if k!= 0:
-            A1 = np.load("processedData/{0}/checkpoint/{1}/{2}A1.npy".format(folder, k, rank))
-            A2 = np.load("processedData/{0}/checkpoint/{1}/{2}A2.npy".format(folder, k, rank))
-            b.setA1(A1) # Assigns A1 for current instance of Block
-            b.setA2(A2) # Assigns A2 for current instance of Block
+            A1, A2 = self.checkpoint.load(rank)
+            b.setA1(np.asarray(A1, self.dtype)) # Assigns A1 for current instance of Block
+            b.setA2(np.asarray(A2, self.dtype)) # Assigns A2 for current instance of Block
         else:
             if rank >= self.n:
                 m = self.m
-                b.createA(np.zeros((m,m), complex)) # Assigns A1 and A2 for current instance of Block.
+                b.setA1(np.zeros((m,m), self.dtype)) # Not 1j*A1 (createA), so the zero pages are never written.
+                b.setA2(np.zeros((m,m), self.dtype))
                 
             else:
-                T = np.load("processedData/{0}/{1}.npy".format(folder,rank))
-                b.setT(T) # Assigns T for current instance of Block.
-        b.setName("results/{0}_uc.npy".format(folder))
+                # T is kept packed (first column and row, see toeplitz_generators.py) until __setup_gen, if the data
+                # was extracted with generators.
+                gen = load_generator(folder, rank)
+                self.packed = gen is not None
+                if self.packed:
+                    b.setT(gen)
+                else:
+                    T = np.load("processedData/{0}/{1}.npy".format(folder,rank))
+                    b.setT(T) # Assigns T for current instance of Block.
+        b.setUcFile(self.ucFile, self.ucOffset)
         self.blocks.addBlock(b)     
         return 
 
@@ -99,7 +154,7 @@ class ToeplitzFactorizor:
     def fact(self, method, p):
         if method not in np.array([SEQ, WY1, WY2, YTY1, YTY2]):
             raise InvalidMethodException(method)
-        if p < 1 and method != SEQ:
+        if p != AUTO and p < 1 and method != SEQ:
             raise InvalidPException(p)
         
         
@@ -109,9 +164,16 @@ class ToeplitzFactorizor:
         
         folder = self.folder
         
+        factStart = time()
+        loopTimes = []
+        
+        if self.detailedSave:
+            LStore = LFactorStore(folder, self.numOfBlocks, n, m, self.comm)
+        
         if self.kCheckpoint==0:
             #### ALGORITHM 3: STEP 1 ####
-            self.__setup_gen()
+            with self.tracer.phase("setup_gen"):
+                self.__setup_gen()
 
             # At this point, MPI processes with rank < n have:
             # A1 = T_rank * cinv        (2m x 2m matrix)
@@ -124,20 +186,35 @@ class ToeplitzFactorizor:
                 if not pad and b.rank == n*(1 + pad) - 1:
                     b.updateuc(b.rank)
                     
-        if (self.detailedSave):
-            for b in self.blocks:        
-                np.save("results/{0}/L_{1}-{2}.npy".format(folder, 0, b.rank), b.getA1())
+            if (self.detailedSave):
+                for b in self.blocks:        
+                    LStore.save(0, b.rank, b.getA1())
+        
+        if self.sharedMemory:
+            self.__share_blocks()
+        else:
+            self.blocks.pack(m, self.dtype) # A1 and A2 of all blocks of the process in one array (see GeneratorBlocks.py).
+        
+        if p == AUTO:
+            p = 1 if method == SEQ else self.__autotune(method)
+        stop = False # Whether the job stops before MAXTIME.
+        last = self.kCheckpoint # Last loop of this process.
         #### ALGORITHM 3: STEP 3 ####
         for k in range(self.kCheckpoint + 1,n*(1 + pad)):
             
             if self.rank == 0:
                 print ("Loop {0} of {1}".format(k,2*n-1))
+            loopStart = time()
                 
             self.k = k
+            self.tracer.k = k
             
             #### ALGORITHM 3: STEP 4 #### 
             # Build current generator at step k: A(k) = [A1(s1:e1,:) A2(s2:e2,:)]
             s1, e1, s2, e2 = self.__set_curr_gen(k, n) # Set s1, e1, s2, e2, work1, work2 for all MPI processes.
+            if not self.__retire(k, e1):
+                break
+            last = k
             
             #### ALGORITHM 3: STEP 5 ####
             # Reduce current generator A(k) to proper form.
@@ -147,13 +224,18 @@ class ToeplitzFactorizor:
                 self.__block_reduc(s1, e1, s2, e2, m, p, method, k)
             
             # Save results immediately if we reached the end of the loop
-            for b in self.blocks:
-                if b.rank <=e1 and b.rank + k == n*(1 + pad) - 1:
-                    b.updateuc(k%self.n)
-                if b.rank <= e1 and self.detailedSave:
-                    np.save("results/{0}/L_{1}-{2}.npy".format(folder, k, b.rank + k), -b.getA1())
+            with self.tracer.phase("save"):
+                for b in self.blocks:
+                    if b.rank <=e1 and b.rank + k == n*(1 + pad) - 1:
+                        b.updateuc(k%self.n)
+                    if b.rank <= e1 and self.detailedSave:
+                        LStore.save(k, b.rank, -b.getA1())
                 
+            loopTimes.append(time() - loopStart)
+            
             # CheckPoint
+            # 1: the checkpoint is written in the background while the loop continues.
+            # 2: the job is about to run out of time; the checkpoint is completed before exiting.
             saveCheckpoint = np.array([0])
             if self.rank==0:
                 timePerLoop.append(time() - sum(timePerLoop) - startTime)
@@ -161,23 +243,196 @@ class ToeplitzFactorizor:
                 elapsedTime = time() - startTime
                 if elapsedTime + max(timePerLoop) >= MAXTIME: # Max instead of np.mean, just to be safe
                     print ("Saving Checkpoint #{0}".format(k))
-                    if not os.path.exists("processedData/{0}/checkpoint/{1}/".format(folder, k)):
-                        try:
-                            os.makedirs("processedData/{0}/checkpoint/{1}/".format(folder, k))
-                        except:
-                            pass
+                    saveCheckpoint = np.array([2])
+                elif self.checkpointInterval and k % self.checkpointInterval == 0 and k < n*(1 + pad) - 1:
+                    print ("Saving Checkpoint #{0}".format(k))
                     saveCheckpoint = np.array([1])
-            self.comm.Bcast(saveCheckpoint, root=0)
+            self.loopComm.Bcast(saveCheckpoint, root=0)
             
             if saveCheckpoint:
-                for b in self.blocks:
-                    # Creating Checkpoint
-                    A1 = np.save("processedData/{0}/checkpoint/{1}/{2}A1.npy".format(folder, k, b.rank), b.getA1())
-                    A2 = np.save("processedData/{0}/checkpoint/{1}/{2}A2.npy".format(folder, k, b.rank), b.getA2())
-                exit()
+                with self.tracer.phase("checkpoint"):
+                    self.checkpoint.save(k, self.blocks)
+            if saveCheckpoint == 2:
+                stop = True
+                break
+        
+        self.checkpoint.close()
+        stop, k = self.__rejoin(stop, last)
+        loopTimes += [0.]*(k - self.kCheckpoint - len(loopTimes)) # The loops after this process left.
+        if self.limits is not None:
+            self.limits.restore_original_limits()
+        if stop:
+            if self.detailedSave:
+                LStore.close()
+            self.ucFile.Close()
+            if self.traceFile:
+                self.tracer.save(self.traceFile)
+            exit()
+        
+        if self.detailedSave:
+            LStore.close()
+        self.ucFile.Close()
+        if self.win is not None:
+            self.win.Unlock_all()
+            self.win.Free()
+        if self.statsFile:
+            self.__save_stats(method, p, time() - factStart, loopTimes)
+        if self.traceFile:
+            self.tracer.save(self.traceFile)
 
     ## Private Methods
     
+    def __autotune(self, method):
+        # Returns the fastest p for this m, number of processes and number of BLAS threads: the cached one (see
+        # autotune.py), or the best of the candidates, each timed over the next PROBE_LOOPS loops. The generator is
+        # restored after each probe, so the decomposition then starts over from the current loop.
+        threads = blas_threads()
+        p = None
+        if self.rank == 0:
+            p = load_p(self.m, self.size, threads, method)
+        p = self.comm.bcast(p, root=0)
+        if p is not None:
+            if self.rank == 0:
+                print ("Using p = {0} (from {1})".format(p, CACHE))
+            return p
+        
+        ps = candidates(self.m)
+        if len(ps) == 1:
+            if self.rank == 0:
+                print ("Using p = {0} (the only candidate for m = {1}, not timed)".format(ps[0], self.m))
+            return ps[0]
+        
+        saved = [(b, b.getA1().copy(), b.getA2().copy()) for b in self.blocks]
+        zeroFrom = self.zeroFrom
+        first = self.kCheckpoint + 1
+        last = min(first + PROBE_LOOPS, self.numOfBlocks)
+        times = {}
+        for p in ps:
+            self.comm.Barrier()
+            start = time()
+            with self.tracer.phase("autotune"):
+                for k in range(first, last):
+                    self.k = k
+                    self.tracer.k = k
+                    s1, e1, s2, e2 = self.__set_curr_gen(k, self.n)
+                    self.__block_reduc(s1, e1, s2, e2, self.m, p, method, k)
+            times[p] = self.comm.allreduce(time() - start, op=MPI.MAX)
+            for b, A1, A2 in saved:
+                for X, Y in [(b.getA1(), A1), (b.getA2(), A2)]:
+                    if np.any(X) or np.any(Y): # Blocks which are still zero are not written (see Blocks.pack).
+                        X[:] = Y
+            self.zeroFrom = zeroFrom
+            self.__node_sync()
+        del saved
+        
+        p = min(times, key=times.get)
+        if self.rank == 0:
+            for q in sorted(times):
+                print ("p = {0}: {1:.3f} s for {2} loops".format(q, times[q], last - first))
+            print ("Using p = {0}".format(p))
+            save_p(self.m, self.size, threads, method, p)
+        return p
+    
+    def __retire(self, k, e1):
+        # From loop k on, the blocks e1+1, ..., k-1 take no further part in the decomposition: A1 is no longer updated
+        # (rank > e1), and A2 has been updated for the last time (rank < k). The processes which hold no other block leave
+        # loopComm, and wait for the end of the loop in __rejoin; the processes of their node which remain share out
+        # their BLAS threads. Every process finds the same processes from k and e1. Returns whether this process remains.
+        ranks = sorted(set([r%self.size for r in list(range(e1 + 1)) + list(range(k, self.numOfBlocks))]))
+        if ranks == self.loopRanks:
+            return True
+        self.checkpoint.commit() # The pending checkpoint is completed by the processes which wrote it.
+        remains = self.rank in ranks
+        color = 0 if remains else MPI.UNDEFINED
+        loopComm = self.loopComm.Split(color, self.rank)
+        self.nodeLoopComm = self.nodeLoopComm.Split(color, self.rank)
+        self.loopRanks = ranks
+        if self.rank == 0:
+            print ("{0} processes remain".format(len(ranks)))
+        if not remains:
+            return False
+        if isinstance(self.comm, InstrumentedComm):
+            loopComm = InstrumentedComm(loopComm, self.comm.tracer, self.comm.stats)
+        self.loopComm = loopComm
+        self.checkpoint.comm = loopComm
+        self.__share_threads()
+        return True
+    
+    def __share_threads(self):
+        # Collective over loopComm. Shares the BLAS threads of all the processes of the node among those which remain in
+        # the loop (see autotune.limit_blas_threads). Rank 0 reports the processes which could not do so: the number of
+        # threads per process is unknown (see autotune.blas_threads), or no way to set it was found.
+        limits = None
+        if self.threads is not None:
+            total = self.threads*self.nodeComm.Get_size()
+            size = self.nodeLoopComm.Get_size()
+            threads = total//size + (1 if self.nodeLoopComm.Get_rank() < total % size else 0)
+            limits = limit_blas_threads(threads)
+            if self.limits is None:
+                self.limits = limits # Restores the original number of threads at the end of fact.
+        failed = self.loopComm.allreduce(int(limits is None))
+        if self.rank == 0 and failed > 0:
+            print ("Warning: {0} of the {1} remaining processes cannot take the BLAS threads of the processes which have left "
+                   "(set OMP_NUM_THREADS, and use a BLAS with a thread function, or threadpoolctl)".format(failed, len(self.loopRanks)))
+    
+    def __rejoin(self, stop, k):
+        # Collective. The processes which have left the loop (see __retire) wait here for the others, without using their
+        # core. Returns whether the job stops before MAXTIME, and the last loop k, as decided by rank 0.
+        status = np.array([int(stop), k])
+        request = self.comm.Ibcast(status, root=0)
+        while not request.Test():
+            sleep(RETIRED_POLL)
+        return bool(status[0]), int(status[1])
+    
+    def __save_stats(self, method, p, totalTime, loopTimes):
+        # Gathers the statistics of all processes on rank 0, which saves them to self.statsFile.
+        try:
+            import resource
+            peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024 # Linux reports kB.
+        except ImportError:
+            peakRSS = None
+        stats = {"rank": self.rank, "blocks": [b.rank for b in self.blocks], "firstLoop": self.kCheckpoint + 1,
+                 "totalTime": totalTime, "loopTimes": loopTimes, "peakRSS": peakRSS}
+        stats.update(self.comm.stats)
+        stats = self.comm.gather(stats, root=0)
+        if self.rank == 0:
+            with open(self.statsFile, "w") as f:
+                json.dump({"folder": self.folder, "n": self.n, "m": self.m, "pad": int(self.pad), "method": method, "p": p,
+                           "size": self.size, "chunk": self.chunk, "ranks": stats}, f, indent=1)
+    
+    def __share_blocks(self):
+        # Moves A1 and A2 of the blocks of this process to an MPI shared-memory window of the node, and maps the blocks of
+        # the other processes of the node. A pair (r, r+k) on the node is then updated entirely by the process which holds
+        # A1_r, directly in the memory of the process which holds A2_r+k, instead of with messages. Each block is in one
+        # pair at a time, so the processes never write to the same block; they synchronize at the end of each reduction
+        # step (__node_sync), before the blocks of the next step are read.
+        m = self.m
+        ranks = self.blocks.ranks()
+        self.win = MPI.Win.Allocate_shared(len(ranks)*2*m*m*self.dtype.itemsize, self.dtype.itemsize, comm=self.nodeComm)
+        self.win.Lock_all(MPI.MODE_NOCHECK)
+        self.blocks.pack(m, self.dtype, self.__segment(self.nodeComm.Get_rank(), len(ranks)))
+        
+        for q, qRanks in enumerate(self.nodeComm.allgather(ranks)):
+            segment = self.__segment(q, len(qRanks))
+            for i, r in enumerate(qRanks):
+                self.nodeBlocks[r] = (segment, i)
+        self.__node_sync()
+        if self.rank == 0:
+            print ("{0} processes share the memory of node 0".format(self.nodeComm.Get_size()))
+    
+    def __segment(self, q, count):
+        # The blocks of process q of the node, as an array of shape (2, count, m, m) (see Blocks.pack).
+        buf, itemsize = self.win.Shared_query(q)
+        return np.ndarray(buffer=buf, dtype=self.dtype, shape=(2, count, self.m, self.m))
+    
+    def __node_sync(self):
+        # Makes the writes of the processes of the node to the shared-memory window visible to each other.
+        if self.win is None:
+            return
+        self.win.Sync()
+        self.nodeLoopComm.Barrier()
+        self.win.Sync()
+    
     #### ALGORITHM 3: STEP 1 ####
     def __setup_gen(self): # Sets up generator matrix A.
         n = self.n
@@ -188,7 +443,10 @@ class ToeplitzFactorizor:
         
         # The root rank will compute the cholesky decomposition
         if self.blocks.hasRank(0):
-            c = cholesky(self.blocks.getBlock(0).getT())
+            T = self.blocks.getBlock(0).getT()
+            if self.packed:
+                T = build_block(T)
+            c = cholesky(T)
             c = np.conj(c)
         else:
             c = np.empty((m,m),complex)
@@ -198,7 +456,11 @@ class ToeplitzFactorizor:
         for b in self.blocks:
             if b.rank < self.n:
 #                b.createA(ztrsm(alpha=1.0, a=c, b=b.getT().T, lower=1).T)
-                b.createA(ztrtrs(a=c, b=b.getT().T, lower=1)[0].T)
+                if self.packed:
+                    TT = build_block(b.getT(), transpose=True)
+                else:
+                    TT = b.getT().T
+                b.createA(np.asarray(ztrtrs(a=c, b=TT, lower=1)[0].T, self.dtype))
             
         # We are done with T.
         for b in self.blocks:
@@ -229,15 +491,10 @@ class ToeplitzFactorizor:
     #### ALGORITHM 8 ####
     def __block_reduc(self, s1, e1, s2, e2, m, p, method, k):
         n = self.n
+        self.zeroFrom = max(self.zeroFrom, s2 + 1) # The pivot rows of rank s2=k are written (only matters if n = 1).
        
-        X2_list = np.zeros((m, m+1), complex)
+        X2_list = np.zeros((m, m+1), self.dtype)
         for sb1 in range (0, m, p):
-            
-            for b in self.blocks:
-                b.setWork(None, None)
-                if b.rank==0: b.setWork1(s2)
-                if b.rank==s2: b.setWork2(0)
-        
             sb2 = s2*m + sb1
             eb1 = min(sb1 + p, m) # next j
             eb2 = s2*m + eb1
@@ -245,55 +502,27 @@ class ToeplitzFactorizor:
             u2 = eb2
             p_eff = min(p, m - sb1)
             
-            temp =  np.zeros((p_eff, m+1), complex)
-            if method == WY1 or method == WY2:
-                S = np.array([np.zeros((m,p)),np.zeros((m,p))], complex)
-            elif method == YTY1 or YTY2:
-                S = np.zeros((p, p), complex)
-            
+            #### ALGORITHM 5 #### 
+            # Compute X2 and beta for the Householder vectors of the panel.
             
-            for j in range(0, p_eff):
-                j1 = sb1 + j
-                j2 = sb2 + j
-                
-                #### ALGORITHM 5 #### 
-                # Compute X2 and beta for jth Householder vector
-                
-                # The following function involves the passing of messages between rank=0 and rank=s2=k (both directions).
-                data= self.__house_vec(j1, s2, j, b)
-  
-                temp[j] = data
-                X2 = data[:self.m]
-                beta = data[-1]
-                
-                # The following function involves the passing of messages between rank=0 and rank=s2=k (both directions).
-                self.__seq_update(X2, beta, eb1, eb2, s2, j1, m, n)
+            # The following function passes one message in each direction between rank=0 and rank=s2=k.
+            with self.tracer.phase("panel_reduc"):
+                temp = self.__panel_reduc(sb1, eb1, s2)
 
             XX2 = temp[:,:m]
-            if b.rank == s2 or b.rank == 0:
-                S = self.__aggregate(S, XX2, beta, m, j, p_eff, method)
-                self.__set_curr_gen(s2, n) # Updates work1, work2.
+            if self.blocks.hasRank(s2) or self.blocks.hasRank(0):
+                with self.tracer.phase("aggregate"):
+                    S = aggregate(XX2, method)
                 
                 # The following function involves the passing of messages between rank=0 and rank=s2=k (both directions).
-                self.__new_block_update(XX2, sb1, eb1, u1, e1, s2,  sb2, eb2, u2, e2, S, m, p_eff)
+                with self.tracer.phase("new_block_update"):
+                    self.__new_block_update(XX2, sb1, eb1, u1, e1, s2,  sb2, eb2, u2, e2, S, m, p_eff, method)
             X2_list[sb1:sb1+p_eff,:] = temp
         
-        b.createTemp(np.zeros((m, m+1), complex))
-        b.setTemp(X2_list)
-        
-        if b.getCond()[0]:
-            pass
-        else:
-            self.comm.Bcast(b.getTemp(), root=s2)
+        self.loopComm.Bcast(X2_list, root=self.loopRanks.index(s2%self.size))
             
-        temp = b.getTemp()
+        temp = X2_list
         for sb1 in range (0, m, p):
-            
-            for b in self.blocks:
-                b.setWork(None, None)
-                if b.rank==0: b.setWork1(s2)
-                if b.rank==s2: b.setWork2(0)
-        
             sb2 = s2*m + sb1
             eb1 = min(sb1 + p, m) # next j
             eb2 = s2*m + eb1
@@ -303,148 +532,201 @@ class ToeplitzFactorizor:
             
             temp2 = temp[sb1:sb1+p_eff,:]
             XX2 = temp2[:,:m]
-            beta = temp2[-1,-1]
-            if method == YTY1 or YTY2:
-                S = np.zeros((p, p), complex)
-            S = self.__aggregate(S, XX2, beta, m, j, p_eff, method)
-            self.__set_curr_gen(s2, n) # Updates work
-            self.__block_update(XX2, sb1, eb1, u1, e1, s2,  sb2, eb2, u2, e2, S, method)
+            with self.tracer.phase("aggregate"):
+                S = aggregate(XX2, method)
+            with self.tracer.phase("block_update"):
+                self.__block_update(XX2, sb1, eb1, u1, e1, s2,  sb2, eb2, u2, e2, S, method)
+            self.zeroFrom = max(self.zeroFrom, e2 + 1) # A2 of the blocks s2, ..., e2 has been updated.
+        self.__node_sync()
         return
     
-    def __new_block_update(self, X2, sb1, eb1, u1, e1,s2, sb2, eb2, u2, e2, S, m, p_eff):
-        for b in self.blocks:
-            num = self.numOfBlocks
-            invT = S
-            if b.rank == s2: # rank s2=k sends to rank 0.
-                s = u1
-                A2 = b.getA2()
-                if s != m:
-                    B2 = zgemm(alpha=1.0, a=X2.T[:m, :p_eff], b=A2.T[:m, s:], trans_a=2).T
-                else:
-                    B2 = np.array([])
-                self.comm.Send(B2, dest=b.getWork2()%self.size, tag=3*num + b.getWork2())
-                del A2
-                
-            if b.rank == 0: # rank 0 receives from and sends to rank s2=k.
-                s=u1
-                
-                A1 = b.getA1()
-                B1 = A1[s:, sb1:eb1]
-                
-                B2 = np.empty((m - s, p_eff), complex)
-                self.comm.Recv(B2, source=b.getWork1()%self.size, tag=3*num + b.rank)  
-                M = B1 - B2
-                
-                if s != m: # if M is nonempty
-#                    M = ztrsm(alpha=1.0, a=invT.T[:p_eff,:p_eff], b=M.T, lower=1).T
-                    M = ztrtrs(a=invT.T[:p_eff,:p_eff], b=M.T, lower=1)[0].T
-                
-                self.comm.Send(M, dest=b.getWork1()%self.size, tag=4*num + b.rank)
-                A1[s:, sb1:eb1] = A1[s:, sb1:eb1] + M
-                del A1   
+    def __panel_reduc(self, sb1, eb1, s2):
+        # Reduces the panel of columns sb1, ..., eb1-1 with O(1) messages: rank s2=k sends rows sb1, ..., eb1-1 of its A2 to
+        # rank 0, rank 0 reduces the panel locally with level-3 BLAS (factor_panel), and sends the Householder vectors
+        # back to rank s2=k. Returns the rows [X2 | beta] of the panel (zero on the other ranks).
+        m = self.m
+        p_eff = eb1 - sb1
+        num = self.numOfBlocks
+        blocks = self.blocks
+        data = np.zeros((p_eff, m+1), self.dtype)
+        panel = np.empty((p_eff, m), self.dtype)
+        
+        if blocks.hasRank(s2): # rank s2=k sends to rank 0.
+            A2 = blocks.getBlock(s2).getA2()
+            panel[:] = A2[sb1:eb1, :]
+            if not blocks.hasRank(0):
+                self.comm.Send(panel, dest=0, tag=2*num + s2)
+            
+        if blocks.hasRank(0): # rank 0 receives from and sends to rank s2=k.
+            A1 = blocks.getBlock(0).getA1()
+            if not blocks.hasRank(s2):
+                self.comm.Recv(panel, source=s2%self.size, tag=2*num + s2)
+            data[:, -1] = factor_panel(A1[sb1:eb1, sb1:eb1], panel)
+            data[:, :m] = panel
+            if not blocks.hasRank(s2):
+                self.comm.Send(data, dest=s2%self.size, tag=5*num + s2)
+            del A1
+            
+        if blocks.hasRank(s2): # rank s2=k receives from rank 0.
+            if not blocks.hasRank(0):
+                self.comm.Recv(data, source=0, tag=5*num + s2)
+            A2[sb1:eb1, :] = data[:, :m]
+            del A2
+        return data
     
-            if b.rank == s2: # rank s2=k receives from rank 0.
-                s = u1
-                M = np.empty((m - s, p_eff), complex)
-                self.comm.Recv(M, source=b.getWork2()%self.size, tag=4*num + b.getWork2())
-                
-                if s != m: # if selection is nonempty
-                    A2 = b.getA2()
-                    A2[s:, :m] = zgemm(alpha=1.0, a=X2.T, b=M.T, beta=1.0, c=A2.T[:m, s:]).T # Very slight improvement over numpy.dot()
-                    del A2 
+    def __new_block_update(self, X2, sb1, eb1, u1, e1,s2, sb2, eb2, u2, e2, S, m, p_eff, method):
+        # rank s2=k sends B2 to rank 0; rank 0 sends M back to rank s2=k. Only rows u1, ..., m-1 are updated.
+        senders = [b for b in self.blocks if b.rank == s2]
+        receivers = [b for b in self.blocks if b.rank == 0]
+        self.__pipelined_update(senders, receivers, u1, X2, S, sb1, eb1, p_eff, method)
         return 
     
-    def __block_update(self, X2, sb1, eb1, u1, e1,s2, sb2, eb2, u2, e2, S, method):
-        def yty2():
-            invT = S
-            for b in self.blocks: # ranks k+1, ..., min(n-1+k, 2n-1) send to (rank-k)
-                if b.work2 == None: 
-                    continue
-                s = 0 
-                if b.rank == s2:
-                    continue
-                A2 = b.getA2()
-                B2 = zgemm(alpha=1.0, a=X2.T[:m, :p_eff], b=A2.T[:m, s:], trans_a=2).T
-                
-                self.comm.Send(B2, dest=b.getWork2()%self.size, tag=3*num + b.getWork2())
-                
-                del A2
-                
-            for b in self.blocks: # ranks 1, ..., min(n-1, 2n-1-k) receive from and send to (rank+k)
-                if b.work1 == None: 
-                    continue
-                s = 0
-                if b.rank == 0:
-                    continue
-                
-                A1 = b.getA1()
-                B1 = A1[s:, sb1:eb1]
-                B2 = np.empty((m - s, p_eff), complex)
-                self.comm.Recv(B2, source=b.getWork1()%self.size, tag=3*num + b.rank)  
-                
-                M = B1 - B2
-#                M = ztrsm(alpha=1.0, a=invT.T[:p_eff,:p_eff], b=M.T, lower=1).T
-                M = ztrtrs(a=invT.T[:p_eff,:p_eff], b=M.T, lower=1)[0].T
-                
-                self.comm.Send(M, dest=b.getWork1()%self.size, tag=4*num + b.rank)
-                A1[s:, sb1:eb1] = A1[s:, sb1:eb1] + M
-                del A1   
-            for b in self.blocks: # ranks k+1, ..., min(n-1+k, 2n-1) receive from (rank-k)
-                if b.work2 == None: 
-                    continue
-                s = 0 
-                if b.rank == s2:
-                    continue
-                M = np.empty((m - s, p_eff), complex)
-                self.comm.Recv(M, source=b.getWork2()%self.size, tag=4*num + b.getWork2())
-                
-                A2 = b.getA2()
-                A2[s:, :m] = zgemm(alpha=1.0, a=X2.T, b=M.T, beta=1.0, c=A2.T[:m, s:]).T # Very slight improvement over numpy.dot()
-                del A2 
-            return 
-        
-        
+    def __pipelined_update(self, senders, receivers, s, X2, S, sb1, eb1, p_eff, method, local=[]):
+        # Applies the aggregated transformation S (see aggregate in hyperbolic_householder.py) to rows s, ..., m-1 of the
+        # pairs (receiver = rank r, sender = rank r+k), and of the pairs (B1, B2) of local, which are on the same node and
+        # are updated in shared memory while the messages of the other pairs are in flight.
+        # With the block-cyclic distribution, all the receivers of a process are paired with senders of one other process,
+        # and both are consecutive in the packed blocks (see Blocks.pack). Their rows are stacked into one view, so each
+        # BLAS call and each message covers all the blocks of the process at once.
+        # The stacked rows are split into chunks of self.chunk rows, and every chunk is sent as soon as it is computed, so
+        # the BLAS calls for one chunk run while the next one is in flight. Chunks use the same tag, and are matched in
+        # order since MPI messages between two processes do not overtake each other; each direction is therefore processed
+        # in the order of its chunks, so the replies M are sent in that order too.
+        # The senders of rank >= zeroFrom come last in the stack, and their A2 is still zero: their B2 = 0 is neither
+        # computed nor sent, and the receivers compute M from B1 alone.
         m = self.m
-        n = self.n
-        nru = e1*m - u1
-        p_eff = eb1 - sb1 
         num = self.numOfBlocks
         
-        if method == WY1:
-            return wy1()
-        elif method == WY2:
-            return wy2()
-        elif method ==YTY1:
-            return yty1()
-        elif method == YTY2:
-            return yty2()
-        
-    def __aggregate(self,S,  X2, beta, m, j, p_eff, method):
-        invT = S
-        
-        invT[:p_eff,:p_eff] = zherk(1.0, X2[:p_eff, :m].T, beta=-1.0, c=np.identity(p_eff,complex).T, trans=2, lower=1, overwrite_c=0).T
-        
-        for jj in range(p_eff):
-            invT[jj,jj] = (invT[jj,jj])/2.
-        
-        return invT
+        # Post all receives first. The chunks of B2 = 0 have no request.
+        requests = []
+        pending = []
+        streams = [] # Indices in pending of the chunks of each direction, in order.
+        if receivers: # rank r receives B2 from rank r+k.
+            G1 = self.__stack(receivers, 0, s)
+            source = receivers[0].getWork1()%self.size
+            tag1 = min(b.rank for b in receivers)
+            zeros = len([b for b in receivers if b.getWork1() >= self.zeroFrom])*(m - s)
+            streams.append([])
+            for c0, c1, zero in self.__chunks(G1.shape[0], zeros):
+                streams[-1].append(len(pending))
+                if zero:
+                    requests.append(None)
+                    pending.append((True, c0, c1, np.zeros((c1 - c0, p_eff), self.dtype)))
+                else:
+                    B2 = np.empty((c1 - c0, p_eff), self.dtype)
+                    requests.append(self.comm.Irecv(B2, source=source, tag=3*num + tag1))
+                    pending.append((True, c0, c1, B2))
+        if senders: # rank r+k receives M from rank r.
+            G2 = self.__stack(senders, 1, s)
+            dest = senders[0].getWork2()%self.size
+            tag2 = min(b.getWork2() for b in senders)
+            zeros = len([b for b in senders if b.rank >= self.zeroFrom])*(m - s)
+            chunks = self.__chunks(G2.shape[0], zeros)
+            streams.append([])
+            for c0, c1, zero in chunks:
+                streams[-1].append(len(pending))
+                M = np.empty((c1 - c0, p_eff), self.dtype)
+                requests.append(self.comm.Irecv(M, source=dest, tag=4*num + tag2))
+                pending.append((False, c0, c1, M))
+        
+        sends = []
+        if senders: # ranks k+1, ..., min(n-1+k, 2n-1) send to (rank-k)
+            for c0, c1, zero in chunks:
+                if not zero:
+                    B2 = send_product(G2[c0:c1, :m], X2, S, method)
+                    sends.append(self.comm.Isend(B2, dest=dest, tag=3*num + tag2))
+        
+        # With wy1, the part of M which does not depend on B2 is computed while B2 is in flight.
+        P = [prepare_reply(G1[c0:c1, sb1:eb1], S, method) if isB2 else None for isB2, c0, c1, buf in pending]
+        
+        for B1, B2 in local:
+            block_update(B1, B2, X2, S, method)
+        
+        # Process the next chunk of whichever direction arrives first.
+        heads = [0]*len(streams)
+        while True:
+            nextRequests = [requests[stream[h]] if h < len(stream) else MPI.REQUEST_NULL for stream, h in zip(streams, heads)]
+            if None in nextRequests:
+                i = nextRequests.index(None) # B2 = 0 was not sent.
+            else:
+                i = self.Request.Waitany(nextRequests)
+                if i == MPI.UNDEFINED:
+                    break
+            j = streams[i][heads[i]]
+            heads[i] += 1
+            isB2, c0, c1, buf = pending[j]
+            if isB2: # ranks 0, ..., min(n-1, 2n-1-k) receive B2 from and send M to (rank+k)
+                M = np.ascontiguousarray(reply(G1[c0:c1, sb1:eb1], buf, S, method, P[j]))
+                sends.append(self.comm.Isend(M, dest=source, tag=4*num + tag1))
+            else: # ranks k, ..., min(n-1+k, 2n-1) receive M from (rank-k)
+                apply_reply(G2[c0:c1, :m], X2, S, buf, method)
+        self.Request.Waitall(sends)
+        return
+    
+    def __chunks(self, rows, zeros):
+        # Splits rows into chunks (c0, c1, zero) of at most self.chunk rows. The last zeros rows (paired with A2 = 0) are
+        # in chunks of their own.
+        chunks = []
+        for first, last, zero in [(0, rows - zeros, False), (rows - zeros, rows, True)]:
+            for c0 in range(first, last, self.chunk):
+                chunks.append((c0, min(c0 + self.chunk, last), zero))
+        return chunks
+    
+    def __stack(self, blocks, which, s):
+        # Rows s, ..., m-1 of A1 (which = 0) or A2 (which = 1) of blocks, stacked as one view. s > 0 only for the single
+        # pair of __new_block_update.
+        G = self.blocks.rows([b.rank for b in blocks], which)
+        if s:
+            return G[s:]
+        return G
+    
+    def __node_rows(self, ranks, which):
+        # Rows of A1 (which = 0) or A2 (which = 1) of the blocks ranks, held by one process of the node, stacked as one
+        # view of the shared-memory window.
+        segment, slot = self.nodeBlocks[min(ranks)]
+        return segment[which, slot:slot + len(ranks)].reshape(-1, self.m)
+    
+    def __block_update(self, X2, sb1, eb1, u1, e1,s2, sb2, eb2, u2, e2, S, method):
+        # All pairs other than (0, s2=k), which were updated in __new_block_update. The methods only differ in
+        # the kernels called by __pipelined_update.
+        p_eff = eb1 - sb1 
+        senders = [b for b in self.blocks if b.work2 != None and b.rank != s2]
+        receivers = [b for b in self.blocks if b.work1 != None and b.rank != 0]
+        local = []
+        if senders and senders[0].getWork2() in self.nodeBlocks: # The holder of the receivers updates the pairs.
+            senders = []
+        if receivers and receivers[0].getWork1() in self.nodeBlocks: # The pairs are on this node (all or none of them).
+            B1 = self.__stack(receivers, 0, 0)[:, sb1:eb1]
+            B2 = self.__node_rows([b.getWork1() for b in receivers], 1)
+            local = [(B1, B2)]
+            receivers = []
+        self.__pipelined_update(senders, receivers, 0, X2, S, sb1, eb1, p_eff, method, local)
+        return 
         
     
     def __seq_reduc(self, s1, e1, s2, e2):
         n = self.n
         m = self.m
+        self.zeroFrom = max(self.zeroFrom, s2 + 1) # The pivot rows of rank s2=k are written (only matters if n = 1).
         for j in range (0, self.m):
-            X2, beta = self.__house_vec(j, s2)
+            with self.tracer.phase("house_vec"):
+                data = self.__house_vec(j, s2)
+            self.loopComm.Bcast(data, root=self.loopRanks.index(s2%self.size)) # Every block in the generator is updated with X2 and beta.
+            X2 = data[:m].astype(self.dtype)
+            beta = self.dtype.type(data[-1])
             
-            self.__seq_update(X2, beta, e1*m, e2*m, s2, j, m, n)
+            with self.tracer.phase("seq_update"):
+                self.__seq_update(X2, beta, e1*m, e2*m, s2, j, m, n)
+            self.zeroFrom = max(self.zeroFrom, e2 + 1) # A2 of the blocks s2, ..., e2 has been updated.
 
     def __seq_update(self,X2, beta, e1, e2, s2, j, m, n):
         u = j + 1
         num = self.numOfBlocks
         
         nru = e1*m - (s2*m + j + 1)  
+        requests = []
         for b in self.blocks: # rank s2=k sends to rank 0.
-            if b.work2 == None: 
+            if b.work2 == None or b.getWork2() in self.nodeBlocks or b.rank >= self.zeroFrom: # B1 = 0 is not sent.
                 continue
             B1 = b.getA2().dot(np.conj(X2.T)) # sizes independent of j. Can't improve with zgemv
             
@@ -452,10 +734,10 @@ class ToeplitzFactorizor:
             end = m
             if b.rank == s2:
                 start = u
-            if b.rank == e2/m:
+            if b.rank == e2//m:
                 end = e2 % m or m
             B1 = B1[start:end] # size decreases with j.
-            self.comm.Send(B1, dest=b.getWork2()%self.size, tag=4*num + b.getWork2())
+            requests.append(self.comm.Isend(B1, dest=b.getWork2()%self.size, tag=4*num + b.getWork2()))
 
         
         for b in self.blocks:# rank 0 receives from and sends to rank s2=k.
@@ -465,102 +747,90 @@ class ToeplitzFactorizor:
             end = m
             if b.rank == 0:
                 start = u
-            if b.rank == e1/m:
+            if b.rank == e1//m:
                 end = e1 % m or m
-            B1 = np.empty(end-start, complex) # size decreases with j.
-            
-            self.comm.Recv(B1, source=b.getWork1()%self.size, tag=4*num + b.rank)
+            if b.getWork1() in self.nodeBlocks: # The pair is on this node: A2 of rank s2=k is updated here, in shared memory.
+                A1 = b.getA1()
+                A2 = self.__node_rows([b.getWork1()], 1)
+                v = A1[start:end, j] - A2[start:end].dot(np.conj(X2.T))
+                A1[start:end,j] -= beta*v
+                if start != end:
+                    geru, = get_blas_funcs(('geru',), (A2,))
+                    geru(-beta, X2, v, incx=1, incy=1, a=A2.T[:,start:end], overwrite_x=0, overwrite_y=0, overwrite_a=1)
+                del A1, A2
+                continue
+            if b.getWork1() >= self.zeroFrom: # A2 of rank s2=k is still zero.
+                B1 = np.zeros(end-start, self.dtype)
+            else:
+                B1 = np.empty(end-start, self.dtype) # size decreases with j.
+                self.comm.Recv(B1, source=b.getWork1()%self.size, tag=4*num + b.rank)
             A1 = b.getA1()
             B2 = A1[start:end, j] # size decreases with j.
                 
             v = B2 - B1 # size decreases with j.
-            self.comm.Send(v, (b.getWork1())%self.size, 5*num + b.getWork1())
+            requests.append(self.comm.Isend(v, (b.getWork1())%self.size, 5*num + b.getWork1()))
             A1[start:end,j] -= beta*v # size decreases with j.
             
             del A1
 
         for b in self.blocks:# rank s2=k receives from rank 0.
-            if b.work2 == None: 
+            if b.work2 == None or b.getWork2() in self.nodeBlocks: 
                 continue
             start = 0
             end = m
             if b.rank == s2:
                 start = u
-            if b.rank == e2/m :
+            if b.rank == e2//m :
                 end = e2 % m or m
-            v = np.empty(end-start,complex) # size decreases with j.
+            v = np.empty(end-start,self.dtype) # size decreases with j.
             self.comm.Recv(v, source=b.getWork2()%self.size, tag=5*num + b.rank)
             if start != end:
                 A2 = b.getA2()
-                zgeru(-beta, X2, v, incx=1, incy=1, a=A2.T[:,start:end], overwrite_x=0, overwrite_y=0, overwrite_a=1)# size of v decreases with j.
+                geru, = get_blas_funcs(('geru',), (A2,))
+                geru(-beta, X2, v, incx=1, incy=1, a=A2.T[:,start:end], overwrite_x=0, overwrite_y=0, overwrite_a=1)# size of v decreases with j.
                 del A2
+        self.Request.Waitall(requests)
+        self.__node_sync()
         
-    def __house_vec(self, j, s2, j_count, b):
-        isZero = np.array([0])
-        b.setFalse(isZero)
-        
-        X2 = np.zeros(self.m, complex)
-        data = np.zeros(self.m+1, complex)
-        beta = np.zeros(1, complex)
-        z = np.zeros(1, complex)
-        sigma = np.zeros(1, complex)
+    def __house_vec(self, j, s2):
+        # Ranks 0 and s2=k exchange the pivot row once: rank s2 sends A2[j,:] to rank 0, and rank 0 sends A1[j,j] to rank s2.
+        # Both ranks then compute sigma, alpha, z, beta and X2 redundantly (from identical data), so no other messages
+        # are needed, and the check for a zero row needs no broadcast.
+        m = self.m
+        data = np.zeros(self.m+1, self.dtype)
+        row = np.empty(m, self.dtype)
+        pivot = np.empty(1, self.dtype)
         blocks = self.blocks
-        n = self.n
         num = self.numOfBlocks
+        requests = []
         
-        if self.rank == s2:
+        if blocks.hasRank(s2): # rank s2=k sends to and receives from rank 0.
             A2 = blocks.getBlock(s2).getA2()
-            if np.all(np.abs(A2[j, :]) < 1e-50): # This number was set to 1e-13, which led to highly inaccurate solutions when called. 
-                isZero=np.array([1])
-                b.setTrue(isZero)
-            self.comm.Bcast(b.getCond(), root=s2%self.size) # rank s2=k broadcasts to all ranks. This call is conditional. I have not seen it called.
-            del A2
-        else:
-            self.comm.Bcast(b.getCond(), root=s2%self.size)
+            row[:] = A2[j, :]
+            if not blocks.hasRank(0):
+                requests.append(self.comm.Isend(row, dest=0, tag=2*num + s2))
+                requests.append(self.comm.Irecv(pivot, source=0, tag=3*num + s2))
+                
+        if blocks.hasRank(0): # rank 0 sends to and receives from rank s2=k.
+            A1 = blocks.getBlock(0).getA1()
+            pivot[0] = A1[j,j]
+            if not blocks.hasRank(s2):
+                requests.append(self.comm.Isend(pivot, dest=s2%self.size, tag=3*num + s2))
+                requests.append(self.comm.Irecv(row, source=s2%self.size, tag=2*num + s2))
         
-        if b.getCond()[0]:
-            print (isZero)
-            data[:self.m] = X2
-            data[-1] = beta[0] 
-            b.setTemp(data)
-            return data
+        if not (blocks.hasRank(0) or blocks.hasRank(s2)):
+            return data # This rank takes no part in the reduction of column j.
+        self.Request.Waitall(requests)
         
-        if self.rank == s2: # rank s2=k sends to and receives from rank 0.
-            A2 = blocks.getBlock(s2).getA2()
-            sigma[0] = dznrm2(A2.T[:, j])**2
-            
-            self.comm.Send(sigma, dest=0, tag=2*num + s2)
-            
-            self.comm.Recv(z, source=0, tag=3*num + s2)
-            self.comm.Recv(beta, source=0, tag=4*num + s2)
-
-            X2 = A2[j,:]/z
+        alpha, X2, beta = house_vec(pivot[0], row)
+        
+        if blocks.hasRank(0):
+            A1[j,j] = -alpha
+            del A1
+        if blocks.hasRank(s2):
             A2[j, :] = X2
-            
-            data[:self.m] = X2
-            data[-1] = beta[0] 
-            b.setTemp(data)
-            self.comm.Send(data, dest=0, tag=5*num + s2)
             del A2
             
-        if self.rank == 0: # rank 0 receives from and sends to rank s2=k
-            A1 = blocks.getBlock(0).getA1()
-            self.comm.Recv(sigma, source=s2%self.size, tag=2*num + s2)
-            alpha = (A1[j,j]**2 - sigma)**0.5
-            x = sigma/A1[j,j]**2
-            if (np.absolute(x) < 1e-12) and (A1.real[j,j] < 0):
-#                print "Using expansion to calculate z."
-                z = A1[j,j]*x/2
-                A1[j,j] = -alpha[0]
-            else:
-                z = A1[j, j]+alpha[0]
-                A1[j,j] = -alpha[0]
-            self.comm.Send(z, dest=s2%self.size, tag=3*num + s2)
-            beta = 2*z*z/(-sigma + z*z)           
-            self.comm.Send(beta, dest=s2%self.size, tag=4*num + s2)
-            
-            self.comm.Recv(data, source=s2%self.size, tag=5*num + s2)
-            del A1
-
+        data[:self.m] = X2
+        data[-1] = beta
         return data # X2, beta
-
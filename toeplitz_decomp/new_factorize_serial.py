@@ -0,0 +1,187 @@
+import numpy as np
+from scipy.linalg.lapack import ztrtrs
+from numpy.linalg import cholesky
+import os,sys,inspect
+from multiprocessing.pool import ThreadPool
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+sys.path.insert(0, currentdir + "/Exceptions")
+
+from ToeplitzFactorizorExceptions import *
+from LFactorStore import LFactorStore
+from toeplitz_generators import load_block
+from hyperbolic_householder import SEQ, WY1, WY2, YTY1, YTY2, house_vec, seq_update, aggregate, block_update, factor_panel
+
+np.seterr(all='raise') # Stop program if NumPy error occurs.
+
+ROWS = 256 # Minimum number of rows per task of the thread pool.
+
+class SerialToeplitzFactorizor:
+    # Single-process counterpart of ToeplitzFactorizor (new_factorize_parallel.py).
+    # Instead of one MPI process per block, all blocks of the generator are kept in two stacked arrays A1, A2 of shape (n(1 + pad), m, m).
+    # Block r of A1 (A2) is the A1 (A2) of the MPI process with rank r. Since the blocks of the current generator A(k) are consecutive
+    # in these arrays, the rows of A(k) form one contiguous (rows x m) view, and each reduction step is a single BLAS call over all blocks.
+    # With threads > 1, the rows of each update are split into chunks, which are updated by a pool of threads. The rows are
+    # transformed independently, and the BLAS calls release the GIL, so the chunks are updated in parallel, on views of A1
+    # and A2, without copies. This replaces the MPI processes of one node, and their messages.
+
+    def __init__(self, folder, n,m, pad, detailedSave = False, threads = 1):
+        self.n = n
+        self.m = m # With padding, m is twice its original value.
+        self.pad = pad
+        self.folder = folder
+
+        self.detailedSave = detailedSave
+        self.numOfBlocks = n*(1 + pad)
+        self.threads = threads
+
+        if not os.path.exists("results/{0}".format(folder)):
+            os.makedirs("results/{0}".format(folder)) # Create results subfolder for current run if one does not exist.
+        self.Name = "results/{0}_uc.npy".format(folder)
+
+        self.A1 = np.zeros((self.numOfBlocks, m, m), complex)
+        self.A2 = np.zeros((self.numOfBlocks, m, m), complex)
+        self.uc = np.zeros((m*n,1), dtype=complex)
+
+    def addBlocks(self):
+        # Blocks with rank >= n are zero (padding), so only the first n blocks are loaded.
+        self.T = np.empty((self.n, self.m, self.m), complex)
+        for rank in range(self.n):
+            self.T[rank] = load_block(self.folder, rank)
+        return
+
+    #### ALGORITHM 3 ####
+    def fact(self, method, p):
+        if method not in np.array([SEQ, WY1, WY2, YTY1, YTY2]):
+            raise InvalidMethodException(method)
+        if p < 1 and method != SEQ:
+            raise InvalidPException(p)
+
+        pad = self.pad
+        m = self.m
+        n = self.n
+        num = self.numOfBlocks
+
+        folder = self.folder
+
+        self.pool = None
+        limits = None
+        if self.threads > 1:
+            self.pool = ThreadPool(self.threads)
+            try:
+                # Each thread calls single-threaded BLAS, so that the machine is not oversubscribed.
+                from threadpoolctl import threadpool_limits
+                limits = threadpool_limits(1, user_api="blas")
+            except ImportError:
+                pass # Set OMP_NUM_THREADS=1 (or OPENBLAS_NUM_THREADS, MKL_NUM_THREADS) instead.
+
+        #### ALGORITHM 3: STEP 1 ####
+        self.__setup_gen()
+
+        if not pad:
+            self.__updateuc(num - 1, num - 1)
+
+        if (self.detailedSave):
+            LStore = LFactorStore(folder, num, n, m)
+            LStore.save(0, 0, self.A1)
+        #### ALGORITHM 3: STEP 3 ####
+        for k in range(1,num):
+
+            print ("Loop {0} of {1}".format(k,2*n-1))
+
+            #### ALGORITHM 3: STEP 4 ####
+            # Build current generator at step k: A(k) = [A1(s1:e1,:) A2(s2:e2,:)]
+            s1, e1, s2, e2 = self.__set_curr_gen(k, n)
+
+            # Rows of the current generator, as (rows x m) views of the stacked blocks.
+            G1 = self.A1[s1:e1 + 1].reshape(-1, m)
+            G2 = self.A2[s2:e2 + 1].reshape(-1, m)
+
+            #### ALGORITHM 3: STEP 5 ####
+            # Reduce current generator A(k) to proper form.
+            if method==SEQ:
+                self.__seq_reduc(G1, G2)
+            else:
+                self.__block_reduc(G1, G2, p, method)
+
+            # Save results immediately if we reached the end of the loop
+            if num - 1 - k <= e1:
+                self.__updateuc(num - 1 - k, k%self.n)
+            if self.detailedSave:
+                LStore.save(k, s1, -self.A1[s1:e1 + 1])
+
+        np.save(self.Name, self.uc)
+        if self.detailedSave:
+            LStore.close()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        if limits is not None:
+            limits.restore_original_limits()
+        return
+
+    ## Private Methods
+
+    #### ALGORITHM 3: STEP 1 ####
+    def __setup_gen(self): # Sets up generator matrix A.
+        n = self.n
+        m = self.m
+
+        c = cholesky(self.T[0])
+        c = np.conj(c)
+
+        # A1_r = T_r * cinv for all r < n, as one triangular solve with n*m right-hand sides.
+        B = np.concatenate(self.T.transpose(0, 2, 1), axis=1)
+        X = ztrtrs(a=c, b=B, lower=1)[0]
+        self.A1[:n] = X.reshape(m, n, m).transpose(1, 2, 0)
+        self.A2[:n] = 1j*self.A1[:n]
+
+        # We are done with T.
+        del self.T
+        return
+
+    #### ALGORITHM 3: STEP 4 ####
+    def __set_curr_gen(self, k, n):
+        s1 = 0
+        e1 = min(n, (n*(1 + self.pad) - k)) -1
+        s2 = k
+        e2 = e1 + s2
+        return s1, e1, s2, e2
+
+    #### ALGORITHM 8 ####
+    def __block_reduc(self, G1, G2, p, method):
+        m = self.m
+        for sb1 in range (0, m, p):
+            eb1 = min(sb1 + p, m) # next j
+
+            # Reduce the panel, updating only the rows of the panel.
+            factor_panel(G1[sb1:eb1, sb1:eb1], G2[sb1:eb1, :])
+
+            # Apply the aggregated transformation to all remaining rows of the generator.
+            XX2 = G2[sb1:eb1, :]
+            self.__rows(block_update, G1[eb1:, sb1:eb1], G2[eb1:, :], XX2, aggregate(XX2, method), method)
+        return
+
+    def __seq_reduc(self, G1, G2):
+        for j in range (0, self.m):
+            #### ALGORITHM 5 ####
+            alpha, X2, beta = house_vec(G1[j,j], G2[j, :])
+            G1[j,j] = -alpha
+            G2[j, :] = X2
+            self.__rows(seq_update, G1[j+1:, j], G2[j+1:, :], X2, beta)
+
+    def __rows(self, update, B1, B2, *args):
+        # Calls update(B1, B2, *args), which transforms each row of [B1 | B2] independently, on chunks of rows in the
+        # threads of the pool.
+        rows = B1.shape[0]
+        if self.pool is None or rows < 2*ROWS:
+            update(B1, B2, *args)
+            return
+        size = max(ROWS, -(-rows//self.threads))
+        self.pool.map(lambda c: update(B1[c:c + size], B2[c:c + size], *args), range(0, rows, size))
+
+    def __updateuc(self, r, i):
+        m = self.m
+        A1 = self.A1[r]
+        temp = -np.conj(A1).T[0,:m//2]
+        temp2 = -np.conj(A1).T[1:m//2+1,0][::-1]
+        self.uc[m*i:m*(i+1),0] = np.append(temp,temp2)
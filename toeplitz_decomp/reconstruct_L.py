@@ -1,26 +1,56 @@
-# This script can be used to reconstruct the Cholesky factor after decomposing with our code. To reconstruct the Cholesky factor, you must set detailSave=True in run_real_new.py. 
+# This script can be used to reconstruct the Cholesky factor after decomposing with our code. To reconstruct the Cholesky factor, you must set detailSave=True in run_real_new.py.
+# The optional last argument selects the mode:
+#   dense   (default) builds L_result in memory and saves it as L_result.npy.
+#   memmap  writes L_result.npy block by block into a disk-backed array. Only the blocks on and below the diagonal which
+#           were saved are written; the rest of the file is never touched (and stays unallocated on most filesystems).
+#   compare compares the saved blocks with L_input.npy (see extract_realData2.py) one block at a time, without holding
+#           either matrix in memory. L_result.npy is not written.
 
 import os, sys
 import numpy as np
+from LFactorStore import LFactor
 
 offsetn     = int(sys.argv[1])
 offsetm     = int(sys.argv[2])
 n           = int(sys.argv[3])
 m           = int(sys.argv[4])
+mode = "dense"
+if len(sys.argv) > 5:
+    mode = sys.argv[5]
 meff = 2*m
-result_dir="results/gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(n),str(meff),str(offsetn),str(offsetm)) # path to folder containing L_0-0.npy, L_0-1.npy etc.
+result_dir="results/gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(n),str(meff),str(offsetn),str(offsetm)) # path to folder containing L_blocks.npy (or L_0-0.npy, L_0-1.npy etc.)
 
-L_result = np.zeros((2*n*meff,2*n*meff), complex)
+L = LFactor(result_dir, 2*n, meff)
 
-for i in range(2*n):
-    for j in range(2*n): 
-        path = result_dir+"/L_"+str(i)+"-"+str(j)+".npy"
-        
-        if os.path.isfile(path):
-            Ltemp = np.load(path)
-            L_result[2*m*j: 2*m*(j + 1), 2*m*i:2*m*(i + 1)] = Ltemp
+if mode == "dense":
+    L_result = np.zeros((2*n*meff,2*n*meff), complex)
+    for j, i in L.stored_blocks():
+        L_result[2*m*j: 2*m*(j + 1), 2*m*i:2*m*(i + 1)] = L.block(j, i)
 
+    # L_result is the complete Cholesky factor.
+    np.save(result_dir+'/L_result.npy',L_result) # Block Toeplitz matrix Inm.
 
-# L_result is the complete Cholesky factor.
-np.save(result_dir+'/L_result.npy',L_result) # Block Toeplitz matrix Inm.
+elif mode == "memmap":
+    L_result = np.lib.format.open_memmap(result_dir+'/L_result.npy', mode='w+', dtype=complex, shape=(2*n*meff,2*n*meff))
+    for j, i in L.stored_blocks():
+        L_result[2*m*j: 2*m*(j + 1), 2*m*i:2*m*(i + 1)] = L.block(j, i)
+    L_result.flush()
+    del L_result
 
+elif mode == "compare":
+    L_input = np.load(result_dir+'/L_input.npy', mmap_mode='r')
+    err = 0.
+    norm = 0.
+    maxErr = 0.
+    for i in range(2*n):
+        for j in range(i, 2*n): # L_input is lower triangular.
+            tile = np.array(L_input[2*m*j: 2*m*(j + 1), 2*m*i:2*m*(i + 1)])
+            diff = L.block(j, i) - tile
+            err += np.sum(np.abs(diff)**2)
+            norm += np.sum(np.abs(tile)**2)
+            maxErr = max(maxErr, np.max(np.abs(diff)))
+    print ("Max. absolute difference: {0}".format(maxErr))
+    print ("Relative difference (Frobenius norm): {0}".format(np.sqrt(err/norm)))
+
+else:
+    print ("Unknown mode {0}. Use dense, memmap or compare.".format(mode))
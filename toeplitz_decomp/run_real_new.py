@@ -2,6 +2,7 @@ import os,sys
 from mpi4py import MPI
 import numpy as np
 from new_factorize_parallel import ToeplitzFactorizor
+from autotune import AUTO
 from time import time
 
 
@@ -9,31 +10,54 @@ comm = MPI.COMM_WORLD
 size = comm.Get_size()
 rank = comm.Get_rank()
 
-if len(sys.argv) != 8 and len(sys.argv) != 9:
+if len(sys.argv) < 8 or len(sys.argv) > 14:
 	if rank==0:
-		print "Please pass in the following arguments: method offsetn offsetm n m p pad"
+		print ("Please pass in the following arguments: method offsetn offsetm n m p pad [detailedSave] [checkpointInterval] [statsFile] [traceFile] [precision] [sharedMemory]")
 else:
     method	= sys.argv[1]
     offsetn	= int(sys.argv[2])
     offsetm	= int(sys.argv[3])
     n		= int(sys.argv[4])
     m		= int(sys.argv[5])
-    p		= int(sys.argv[6])
+    p		= sys.argv[6] if sys.argv[6] == AUTO else int(sys.argv[6]) # "auto": see autotune.py.
     pad		= sys.argv[7] == "1" or sys.argv[7] == "True"
     
     detailedSave = False
-    if len(sys.argv) == 9:
+    if len(sys.argv) >= 9:
         detailedSave = sys.argv[8] == "1" or sys.argv[8] == "True"
+    
+    checkpointInterval = 0 # Number of loops between checkpoints (0 = only save a checkpoint before running out of time).
+    if len(sys.argv) >= 10:
+        checkpointInterval = int(sys.argv[9])
+    
+    statsFile = None # JSON file for the time per loop, peak memory and MPI traffic of each process (see benchmark_suite.py).
+    if len(sys.argv) >= 11 and sys.argv[10] != "0":
+        statsFile = sys.argv[10]
+    
+    traceFile = None # JSON trace of the phases and MPI calls of each process, for chrome://tracing (see Tracer.py).
+    if len(sys.argv) >= 12 and sys.argv[11] != "0":
+        traceFile = sys.argv[11]
+    
+    precision = "double" # double or single (see new_factorize_parallel.py).
+    if len(sys.argv) >= 13:
+        precision = sys.argv[12]
+    
+    sharedMemory = False # Update the pairs of blocks on the same node in an MPI shared-memory window (see new_factorize_parallel.py).
+    if len(sys.argv) == 14:
+        sharedMemory = sys.argv[13] == "1" or sys.argv[13] == "True"
         
     if not os.path.exists("processedData/"):	
         os.makedirs("processedData/")
     
     if pad == 0:
         folder = "gate0_numblock_{}_meff_{}_offsetn_{}_offsetm_{}".format(n, m, offsetn, offsetm)
-        c = ToeplitzFactorizor(folder, n, m, pad, detailedSave)
+        c = ToeplitzFactorizor(folder, n, m, pad, detailedSave, checkpointInterval=checkpointInterval, statsFile=statsFile,
+                               traceFile=traceFile, precision=precision, sharedMemory=sharedMemory)
     if pad == 1:
         folder = "gate0_numblock_{}_meff_{}_offsetn_{}_offsetm_{}".format(n, m*2, offsetn, offsetm)
-        c = ToeplitzFactorizor(folder, n, m*2, pad, detailedSave)
-    for i in range(0, n*(1 + pad)//size):
-        c.addBlock(rank + i*size)
-        c.fact(method, p)
+        c = ToeplitzFactorizor(folder, n, m*2, pad, detailedSave, checkpointInterval=checkpointInterval, statsFile=statsFile,
+                               traceFile=traceFile, precision=precision, sharedMemory=sharedMemory)
+    # Blocks are distributed block-cyclically: rank r owns blocks r, r + size, r + 2*size, ...
+    for i in range(rank, n*(1 + pad), size):
+        c.addBlock(i)
+    c.fact(method, p)
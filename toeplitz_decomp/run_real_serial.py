@@ -0,0 +1,30 @@
+import os,sys
+from new_factorize_serial import SerialToeplitzFactorizor
+
+if len(sys.argv) < 8 or len(sys.argv) > 10:
+    print ("Please pass in the following arguments: method offsetn offsetm n m p pad [detailedSave] [threads]")
+else:
+    method	= sys.argv[1]
+    offsetn	= int(sys.argv[2])
+    offsetm	= int(sys.argv[3])
+    n		= int(sys.argv[4])
+    m		= int(sys.argv[5])
+    p		= int(sys.argv[6])
+    pad		= sys.argv[7] == "1" or sys.argv[7] == "True"
+
+    detailedSave = False
+    if len(sys.argv) >= 9:
+        detailedSave = sys.argv[8] == "1" or sys.argv[8] == "True"
+
+    threads = 1 # Number of threads for the block updates (see new_factorize_serial.py).
+    if len(sys.argv) == 10:
+        threads = int(sys.argv[9])
+
+    if pad == 0:
+        folder = "gate0_numblock_{}_meff_{}_offsetn_{}_offsetm_{}".format(n, m, offsetn, offsetm)
+        c = SerialToeplitzFactorizor(folder, n, m, pad, detailedSave, threads)
+    if pad == 1:
+        folder = "gate0_numblock_{}_meff_{}_offsetn_{}_offsetm_{}".format(n, m*2, offsetn, offsetm)
+        c = SerialToeplitzFactorizor(folder, n, m*2, pad, detailedSave, threads)
+    c.addBlocks()
+    c.fact(method, p)
@@ -0,0 +1,38 @@
+import os
+import numpy as np
+from scipy.linalg import toeplitz
+
+# Each block T_j of the block Toeplitz matrix is itself Toeplitz, so it is described by 2m numbers. Instead of one dense
+# m x m file <j>.npy per block, extract_realData2.py saves all blocks in one file processedData/<folder>/generators.npy
+# of shape (n, 2, m): generators[j, 0] is the first column and generators[j, 1] the first row of the Toeplitz matrix
+# K_j, and T_j = conj(K_j).T is the block used by the factorization.
+
+def generators_path(folder):
+    return "processedData/{0}/generators.npy".format(folder)
+
+def make_generator(col, row):
+    # Returns the generator (2 x m) of K = toeplitz(col, row). As in scipy.linalg.toeplitz, the diagonal is col[0].
+    gen = np.empty((2, len(col)), complex)
+    gen[0] = col
+    gen[1] = row
+    gen[1, 0] = col[0]
+    return gen
+
+def build_block(gen, transpose=False):
+    # Returns T = conj(K).T (or T.T if transpose) from the generator of K.
+    if transpose:
+        return toeplitz(np.conj(gen[0]), np.conj(gen[1]))
+    return toeplitz(np.conj(gen[1]), np.conj(gen[0]))
+
+def load_generator(folder, j):
+    # Returns the generator of block j, or None if the data was extracted as dense blocks only.
+    if not os.path.exists(generators_path(folder)):
+        return None
+    return np.array(np.load(generators_path(folder), mmap_mode='r')[j])
+
+def load_block(folder, j):
+    # Returns block T_j, from generators.npy if it exists, and from <j>.npy otherwise.
+    gen = load_generator(folder, j)
+    if gen is None:
+        return np.load("processedData/{0}/{1}.npy".format(folder, j))
+    return build_block(gen)
@@ -0,0 +1,87 @@
+# This script checks the Cholesky factor computed with detailedSave=True without forming any dense matrix. It estimates
+# ||L L^H - T||_F / ||T||_F with random probes z (Hutchinson): E||(L L^H - T) z||^2 = ||L L^H - T||_F^2 for E[z z^H] = I.
+# T z is computed with FFTs (T is block Toeplitz with Toeplitz blocks, so it is embedded in a 2D circulant matrix), and
+# L z, L^H z with the saved blocks of L, read one at a time.
+# Syntax: python validate_factor.py offsetn offsetm n m [probes]
+
+import sys
+import numpy as np
+from LFactorStore import LFactor
+from toeplitz_generators import load_generator
+
+def toeplitz_symbol(folder, n, numOfBlocks, m):
+    # Returns the FFT of the 2D circulant embedding of T, of shape (2 numOfBlocks, 2m). Entry (i, a), (j, b) of T is
+    # t(i - j, a - b), where block d = j - i >= 0 above the diagonal is K_d = toeplitz(col_d, row_d), and the blocks
+    # below the diagonal are K_d^H. Blocks with d >= n are zero.
+    c = np.zeros((2*numOfBlocks, 2*m), complex)
+    for d in range(n):
+        gen = load_generator(folder, d)
+        if gen is None:
+            T = np.load("processedData/{0}/{1}.npy".format(folder, d)) # T_d = conj(K_d).T
+            col, row = np.conj(T[0, :]), np.conj(T[:, 0])
+        else:
+            col, row = gen[0], gen[1]
+        # K_d: t(-d, s) = col_d[s] (s >= 0), row_d[-s] (s < 0).
+        c[-d, :m] = col
+        c[-d, -1:-m:-1] = row[1:]
+        if d > 0:
+            # K_d^H: t(d, s) = conj(t(-d, -s)).
+            c[d, :m] = np.conj(row)
+            c[d, -1:-m:-1] = np.conj(col[1:])
+    return np.fft.fft2(c)
+
+def T_matvec(symbol, X, numOfBlocks, m):
+    # X: (numOfBlocks*m, probes). Returns T X.
+    probes = X.shape[1]
+    Xp = np.zeros((2*numOfBlocks, 2*m, probes), complex)
+    Xp[:numOfBlocks, :m] = X.reshape(numOfBlocks, m, probes)
+    Y = np.fft.ifft2(symbol[:, :, None]*np.fft.fft2(Xp, axes=(0, 1)), axes=(0, 1))
+    return Y[:numOfBlocks, :m].reshape(numOfBlocks*m, probes)
+
+def L_matvec(L, X, adjoint=False):
+    # X: (numOfBlocks*m, probes). Returns L X (or L^H X), reading each saved block of L once.
+    m = L.m
+    Y = np.zeros(X.shape, complex)
+    for j, i in L.stored_blocks():
+        B = L.block(j, i)
+        if adjoint:
+            Y[i*m:(i + 1)*m] += np.conj(B).T.dot(X[j*m:(j + 1)*m])
+        else:
+            Y[j*m:(j + 1)*m] += B.dot(X[i*m:(i + 1)*m])
+    return Y
+
+def T_norm(symbol, numOfBlocks, m):
+    # Exact ||T||_F: entry t(u, s) appears (numOfBlocks - |u|)(m - |s|) times in T.
+    c = np.fft.ifft2(symbol)
+    u = np.arange(2*numOfBlocks)
+    u = np.where(u < numOfBlocks, u, 2*numOfBlocks - u)
+    s = np.arange(2*m)
+    s = np.where(s < m, s, 2*m - s)
+    count = np.outer(np.maximum(numOfBlocks - u, 0), np.maximum(m - s, 0))
+    return np.sqrt(np.sum(count*np.abs(c)**2))
+
+if __name__ == "__main__":
+    offsetn     = int(sys.argv[1])
+    offsetm     = int(sys.argv[2])
+    n           = int(sys.argv[3])
+    m           = int(sys.argv[4])
+    probes = 8
+    if len(sys.argv) > 5:
+        probes = int(sys.argv[5])
+    meff = 2*m
+    numOfBlocks = 2*n
+    folder = "gate0_numblock_%s_meff_%s_offsetn_%s_offsetm_%s" %(str(n),str(meff),str(offsetn),str(offsetm))
+
+    symbol = toeplitz_symbol(folder, n, numOfBlocks, meff)
+    L = LFactor("results/" + folder, numOfBlocks, meff)
+
+    np.random.seed(0)
+    Z = (np.random.randn(numOfBlocks*meff, probes) + 1j*np.random.randn(numOfBlocks*meff, probes))/np.sqrt(2) # E[z z^H] = I
+    R = L_matvec(L, L_matvec(L, Z, adjoint=True)) - T_matvec(symbol, Z, numOfBlocks, meff)
+    estimates = np.sum(np.abs(R)**2, axis=0) # Unbiased estimates of ||L L^H - T||_F^2.
+
+    normT = T_norm(symbol, numOfBlocks, meff)
+    err = np.sqrt(np.mean(estimates))
+    print ("||T||_F = {0}".format(normT))
+    print ("Estimated ||L L^H - T||_F = {0} ({1} probes)".format(err, probes))
+    print ("Estimated relative error = {0}".format(err/normT))